@@ -0,0 +1,96 @@
+"""Term analytics: histogram sketches and the summaries served by /api/analytics.
+
+db.py keeps two rollup tables current on every write: week_stats (one row
+per TA and week) and section_stats (one row per TA, i.e. per CRN). The
+distributions in them are fixed-bucket histograms, so rollups merge by
+adding counts and a week can be recomputed without rescanning the term.
+"""
+
+from bisect import bisect_left
+
+# Upper bounds (minutes) of the time_taken buckets; one more open-ended bucket follows
+TIME_BUCKETS = (5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 90, 120, 150, 180, 240, 300, 360, 480, 720, 1440)
+
+
+def time_histogram(values):
+    """Bucket counts of time_taken values (len(TIME_BUCKETS) + 1 entries)."""
+    counts = [0] * (len(TIME_BUCKETS) + 1)
+    for value in values:
+        counts[bisect_left(TIME_BUCKETS, value)] += 1
+    return counts
+
+
+def merge_counts(histograms):
+    """Element-wise sum of count lists of possibly different lengths."""
+    merged = []
+    for counts in histograms:
+        if len(counts) > len(merged):
+            merged.extend([0] * (len(counts) - len(merged)))
+        for i, n in enumerate(counts):
+            merged[i] += n
+    return merged
+
+
+def histogram_percentile(counts, q):
+    """Approximate q-th percentile (0-100) of a time histogram, or None if empty.
+
+    Interpolates linearly inside the bucket holding the rank; values in the
+    open-ended last bucket are reported as its lower bound.
+    """
+    total = sum(counts)
+    if total == 0:
+        return None
+    rank = q / 100 * total
+    seen = 0
+    for i, n in enumerate(counts):
+        if n and seen + n >= rank:
+            lower = TIME_BUCKETS[i - 1] if i else 0
+            if i == len(TIME_BUCKETS):
+                return float(lower)
+            return round(lower + (TIME_BUCKETS[i] - lower) * (rank - seen) / n, 1)
+        seen += n
+    return float(TIME_BUCKETS[-1])
+
+
+def time_summary(count, total, counts):
+    return {
+        "count": count,
+        "mean": round(total / count, 1) if count else None,
+        "p50": histogram_percentile(counts, 50),
+        "p90": histogram_percentile(counts, 90),
+        "histogram": {"bounds": list(TIME_BUCKETS), "counts": counts},
+    }
+
+
+def pass_rate(passed, students):
+    return round(passed / students, 4) if students else None
+
+
+def week_summary(row):
+    """API form of a week_stats row."""
+    return {
+        "week": row["week"],
+        "students": row["students"],
+        "passed": row["passed"],
+        "pass_rate": pass_rate(row["passed"], row["students"]),
+        "mean_score": round(row["grade_sum"] / row["grade_possible"], 4) if row["grade_possible"] else None,
+        "eligible": row["eligible"],
+        "time_taken": time_summary(row["time_count"], row["time_sum"], row["time_hist"]),
+    }
+
+
+def section_summary(row):
+    """API form of a section_stats row."""
+    return {
+        "ta_name": row["ta_name"],
+        "weeks": row["weeks"],
+        "students": row["students"],
+        "student_weeks": row["student_weeks"],
+        "passed": row["passed"],
+        "pass_rate": pass_rate(row["passed"], row["student_weeks"]),
+        "mean_score": round(row["grade_sum"] / row["grade_possible"], 4) if row["grade_possible"] else None,
+        "eligible": row["eligible"],
+        "time_taken": time_summary(row["time_count"], row["time_sum"], row["time_hist"]),
+        # perfect_weeks[k] = students perfect in exactly k weeks
+        "perfect_weeks": row["perfect_weeks"],
+    }
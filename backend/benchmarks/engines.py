@@ -0,0 +1,51 @@
+"""Benchmark: dict-based vs columnar reward engine on large cohorts.
+
+Checks that both engines return identical results, then times each.
+
+    python -m benchmarks.engines [--students 20000] [--problems 2] [--repeat 3]
+"""
+
+import argparse
+import time
+
+from rewards import compute_week_rewards
+from rewards_columnar import columnar_available, compute_week_rewards_columnar
+from benchmarks.synth import make_gradesheet
+
+
+def _best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--problems", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not columnar_available():
+        raise SystemExit("numpy is not installed; the columnar engine is unavailable")
+
+    sheets = [make_gradesheet(students=args.students, seed=p) for p in range(args.problems)]
+
+    expected = compute_week_rewards(sheets, 5)
+    actual = compute_week_rewards_columnar(sheets, 5)
+    if actual != expected:
+        raise SystemExit("columnar engine output differs from the dict engine")
+
+    dict_time = _best_of(args.repeat, lambda: compute_week_rewards(sheets, 5))
+    columnar_time = _best_of(args.repeat, lambda: compute_week_rewards_columnar(sheets, 5))
+
+    print(f"students x problems: {args.students} x {args.problems}")
+    print(f"dict engine:         {dict_time * 1000:.1f} ms")
+    print(f"columnar engine:     {columnar_time * 1000:.1f} ms ({dict_time / columnar_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark: latency of light requests while large uploads are computed.
+
+Uploads several large weeks concurrently and pings /api/weeks the whole
+time; a free event loop keeps ping latency flat. Uses a throwaway database.
+
+    python -m benchmarks.loop_latency [--students 40000] [--uploads 2]
+
+Set CPU_EXECUTOR=process to compare the process pool.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import tempfile
+import time
+
+from benchmarks.synth import make_gradesheet
+
+
+def _percentile(values, q):
+    """Nearest-rank percentile (q in 0-1) of a sorted list."""
+    return values[max(1, math.ceil(q * len(values))) - 1]
+
+
+async def _run(app, sheet, uploads):
+    import httpx
+
+    latencies = []
+    done = asyncio.Event()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def ping():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/api/weeks/bench")
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+
+        async def upload():
+            responses = await asyncio.gather(*(
+                client.post(
+                    "/api/compute",
+                    data={"week": week, "ta_name": "bench"},
+                    files={"problem1": ("p1.csv", sheet), "problem2": ("p2.csv", sheet)},
+                )
+                for week in range(1, uploads + 1)
+            ))
+            done.set()
+            return [r.status_code for r in responses]
+
+        start = time.perf_counter()
+        statuses, _ = await asyncio.gather(upload(), ping())
+        return statuses, time.perf_counter() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=40_000)
+    parser.add_argument("--uploads", type=int, default=2)
+    args = parser.parse_args()
+
+    os.environ["REWARDKEEPER_DB"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    import main as app_module
+
+    sheet = make_gradesheet(students=args.students, seed=1)
+    statuses, elapsed, latencies = asyncio.run(_run(app_module.app, sheet, args.uploads))
+
+    print(f"uploads:   {args.uploads} x {args.students} students -> {statuses} in {elapsed:.2f} s")
+    print(f"executor:  {os.getenv('CPU_EXECUTOR', 'thread')}")
+    print(f"pings:     {len(latencies)}")
+    print(f"p50 / p99 / max: {_percentile(latencies, 0.5) * 1000:.1f} / "
+          f"{_percentile(latencies, 0.99) * 1000:.1f} / {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
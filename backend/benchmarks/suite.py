@@ -0,0 +1,205 @@
+"""Benchmark suite: the hot paths of a term, compared against a stored baseline.
+
+Runs every benchmark on deterministic synthetic data (benchmarks.synth) and
+prints the best time of several runs. Database benchmarks use a throwaway
+SQLite file.
+
+    python -m benchmarks.suite                      # run and compare to baseline.json
+    python -m benchmarks.suite --save-baseline      # record a new baseline
+    python -m benchmarks.suite --only parse_gradesheet --only match_students_local
+    python -m benchmarks.suite --quick              # smaller inputs, fewer repeats
+
+Comparisons are only meaningful on the same machine with the same
+parameters; the baseline records both. The exit status is 1 when a
+benchmark is slower than the baseline by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.synth import make_gradesheet, make_pv_roster, make_term, student_names
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def _measure(fn, repeat, setup=None):
+    """(best, median) seconds of fn over repeat runs; setup runs untimed before each."""
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        fn(state) if setup else fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def _compute_week(sheets, week):
+    from rewards import compute_week_rewards
+    return compute_week_rewards(sheets, week)
+
+
+def _ingest(db, ta_name, term):
+    """The /api/compute path for every week: compute, save, streak history."""
+    for week, sheets in enumerate(term, 1):
+        result = _compute_week(sheets, week)
+        db.save_week(ta_name, week, result["students_data"], result["week_range"], result["reward_points"],
+                     result["early_submission"]["total_eligible"], result["early_submission"]["top5"])
+        db.get_streak_history(ta_name, week)
+
+
+def _bulk_import(db, ta_name, term):
+    """The /api/import path: compute every week, save them in one transaction."""
+    weeks = []
+    for week, sheets in enumerate(term, 1):
+        result = _compute_week(sheets, week)
+        weeks.append({
+            "week": week,
+            "students_data": result["students_data"],
+            "week_range": result["week_range"],
+            "reward_points": result["reward_points"],
+            "total_eligible": result["early_submission"]["total_eligible"],
+            "top5": result["early_submission"]["top5"],
+        })
+    db.save_weeks(ta_name, weeks)
+
+
+def build_benchmarks(params):
+    """{name: (fn, setup)} for the given parameters."""
+    import db
+    from prizeversity import PrizeversityClient
+    from rewards import compute_rewards, parse_gradesheet
+
+    students, weeks, attempts = params["students"], params["weeks"], params["attempts"]
+    sheet = make_gradesheet(students, seed=1, attempts=attempts)
+    sheet2 = make_gradesheet(students, seed=2, attempts=attempts)
+    term = make_term(students, weeks, seed=3, attempts=attempts,
+                     failure_rate=params["failure_rate"], absent_rate=params["absent_rate"])
+    names = student_names(params["match_students"])
+    roster = make_pv_roster(names, seed=4)
+    client = PrizeversityClient("bench")
+
+    counter = iter(range(10 ** 9))
+
+    def fresh_ta():
+        return f"bench-{next(counter)}"
+
+    # A stored term for the read benchmarks
+    _ingest(db, "bench-read", term)
+
+    return {
+        "parse_gradesheet": (lambda: parse_gradesheet(sheet), None),
+        "compute_rewards": (lambda: compute_rewards(sheet, sheet2, 5), None),
+        "get_streak_history": (lambda: db.get_streak_history("bench-read", weeks), None),
+        "ingest_term": (lambda ta: _ingest(db, ta, term), fresh_ta),
+        "bulk_import_term": (lambda ta: _bulk_import(db, ta, term), fresh_ta),
+        "match_students_local": (lambda: client.match_students_local(roster, names), None),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against the baseline; return the names that regressed."""
+    regressed = []
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"  {name:<22} (not in baseline)")
+            continue
+        ratio = result["best"] / base["best"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print(f"  {name:<22} {base['best'] * 1000:10.1f} -> {result['best'] * 1000:10.1f} ms  ({ratio:.2f}x){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--weeks", type=int, default=14)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--absent-rate", type=float, default=0.05)
+    parser.add_argument("--match-students", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="small inputs and 3 repeats, for a smoke run")
+    parser.add_argument("--only", action="append", help="run only this benchmark (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.students, args.weeks, args.match_students, args.repeat = 100, 6, 100, 3
+    params = {
+        "students": args.students,
+        "weeks": args.weeks,
+        "attempts": args.attempts,
+        "failure_rate": args.failure_rate,
+        "absent_rate": args.absent_rate,
+        "match_students": args.match_students,
+        "repeat": args.repeat,
+    }
+
+    os.environ["REWARDKEEPER_DB"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    import db
+    db.init_db()
+    benchmarks = build_benchmarks(params)
+    unknown = set(args.only or ()) - set(benchmarks)
+    if unknown:
+        raise SystemExit(f"unknown benchmark(s): {', '.join(sorted(unknown))}; choose from {', '.join(benchmarks)}")
+
+    results = {}
+    for name, (fn, setup) in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        best, median = _measure(fn, args.repeat, setup)
+        results[name] = {"best": round(best, 6), "median": round(median, 6)}
+        print(f"{name:<24} best {best * 1000:10.1f} ms   median {median * 1000:10.1f} ms")
+
+    run = {
+        "date": date.today().isoformat(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "params": params,
+        "results": results,
+    }
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        if baseline.get("params") == params:
+            # Keep results of benchmarks that were not re-run
+            run["results"] = {**baseline.get("results", {}), **results}
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare with (run with --save-baseline)")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("params") != params:
+        print(f"baseline was recorded with different parameters: {baseline.get('params')}")
+        return
+    print(f"\ncompared with baseline from {baseline['date']} ({baseline['machine']}, Python {baseline['python']}):")
+    if compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Deterministic synthetic gradesheets in the LMS export format."""
+
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+
+HEADER = ["#", "Student", "Test Result", "Grade", "Submission Date", "Evaluated"]
+
+FIRST_NAMES = [
+    "Alex", "Priya", "Jordan", "Sam", "Taylor", "Morgan", "Chris", "Avery",
+    "Casey", "Riley", "Jamie", "Drew", "Quinn", "Reese", "Skyler", "Rowan",
+]
+LAST_NAMES = [
+    "Carter", "Mehta", "Lee", "Rivera", "Kim", "Blake", "Nguyen", "Chen",
+    "Jones", "Patel", "Garcia", "Okafor", "Novak", "Silva", "Haddad", "Moreau",
+]
+
+
+def student_names(count, seed=0):
+    """Return `count` distinct, reproducible student names."""
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        names.append(f"{first} {last} {i:04d}")
+    return names
+
+
+def format_submission_date(dt):
+    """Format like the LMS export: "1/22/2026, 2:57:12 PM" (no zero padding)."""
+    hour = dt.hour % 12 or 12
+    meridiem = "AM" if dt.hour < 12 else "PM"
+    return f"{dt.month}/{dt.day}/{dt.year}, {hour}:{dt.minute:02d}:{dt.second:02d} {meridiem}"
+
+
+def make_gradesheet(students=200, seed=0, full_mark=5, day=datetime(2026, 1, 22, 14, 30),
+                    attempts=1, failure_rate=0.2, absent_rate=0.0):
+    """Return one problem's gradesheet as a CSV string.
+
+    Each student's final attempt earns full marks with probability
+    1 - failure_rate; submissions are spread over the two hours after `day`.
+    With attempts > 1, students make 1..attempts submissions, earlier ones
+    with lower grades (the last row counts). absent_rate drops students.
+    """
+    rng = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out, quoting=csv.QUOTE_ALL)
+    writer.writerow(HEADER)
+    row_id = 0
+    for name in student_names(students):
+        if absent_rate and rng.random() < absent_rate:
+            continue
+        passed = rng.random() < 1 - failure_rate
+        submitted = day + timedelta(seconds=rng.randrange(2 * 60 * 60))
+        final_grade = full_mark if passed else rng.randrange(full_mark)
+        tries = rng.randint(1, attempts) if attempts > 1 else 1
+        for attempt in range(tries, 0, -1):
+            last = attempt == 1
+            row_id += 1
+            writer.writerow([
+                row_id,
+                name,
+                "1 passed of 1" if last and passed else "0 passed of 1",
+                final_grade if last else rng.randrange(full_mark),
+                format_submission_date(submitted - timedelta(minutes=5 * (attempt - 1))),
+                "Test Instructor",
+            ])
+    return out.getvalue()
+
+
+def make_term(students=200, weeks=14, problems=2, seed=0, attempts=1, failure_rate=0.2,
+              absent_rate=0.05, start=datetime(2026, 1, 15, 14, 30)):
+    """Return a term of gradesheets: one list of problem CSVs per week, one lab a week."""
+    term = []
+    for week in range(weeks):
+        day = start + timedelta(days=7 * week)
+        term.append([
+            make_gradesheet(
+                students, seed=seed * 10_000 + week * 100 + p, day=day, attempts=attempts,
+                failure_rate=failure_rate, absent_rate=absent_rate,
+            )
+            for p in range(problems)
+        ])
+    return term
+
+
+def make_pv_roster(names, seed=0, perturb_rate=0.5, extra=0.1):
+    """Prizeversity-style students for `names`, as a TA's roster would look.
+
+    About perturb_rate of the names are altered the way they drift between
+    systems (swapped order, upper case, a dropped letter, a second surname),
+    and `extra` adds unrelated students.
+    """
+    rng = random.Random(seed)
+    roster = []
+    for i, name in enumerate(names):
+        parts = name.split()
+        if rng.random() < perturb_rate:
+            kind = rng.randrange(4)
+            if kind == 0:
+                parts = parts[1:2] + parts[:1] + parts[2:]
+            elif kind == 1:
+                parts = [p.upper() for p in parts]
+            elif kind == 2 and len(parts[0]) > 3:
+                cut = rng.randrange(1, len(parts[0]))
+                parts[0] = parts[0][:cut] + parts[0][cut + 1:]
+            else:
+                parts.insert(2, rng.choice(LAST_NAMES))
+        roster.append({"studentId": f"pv{i:05d}", "name": " ".join(parts)})
+    for j in range(int(len(names) * extra)):
+        roster.append({"studentId": f"pvx{j:05d}", "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} x{j:04d}"})
+    rng.shuffle(roster)
+    return roster
@@ -0,0 +1,54 @@
+"""Micro-benchmark: per-row Submission Date parsing.
+
+Compares the original ``datetime.strptime`` call against
+``rewards.parse_submission_date`` on a large synthetic sheet, then times a
+whole ``parse_gradesheet`` run.
+
+    python -m benchmarks.timestamps [--rows 50000] [--repeat 5]
+"""
+
+import argparse
+import csv
+import io
+import time
+from datetime import datetime
+
+from rewards import SUBMISSION_DATE_FORMAT, parse_gradesheet, parse_submission_date
+from benchmarks.synth import make_gradesheet
+
+
+def _best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sheet = make_gradesheet(students=args.rows)
+    values = [row["Submission Date"] for row in csv.DictReader(io.StringIO(sheet))]
+
+    assert [parse_submission_date(v) for v in values] == [
+        datetime.strptime(v, SUBMISSION_DATE_FORMAT) for v in values
+    ]
+
+    baseline = _best_of(args.repeat, lambda: [datetime.strptime(v, SUBMISSION_DATE_FORMAT) for v in values])
+    fast = _best_of(args.repeat, lambda: [parse_submission_date(v) for v in values])
+    whole = _best_of(args.repeat, lambda: parse_gradesheet(sheet))
+
+    per_row = lambda seconds: seconds / len(values) * 1e6
+    print(f"rows:                   {len(values)}")
+    print(f"strptime:               {per_row(baseline):.2f} us/row")
+    print(f"parse_submission_date:  {per_row(fast):.2f} us/row  ({baseline / fast:.1f}x)")
+    print(f"parse_gradesheet total: {whole * 1000:.1f} ms ({per_row(whole):.2f} us/row)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Small in-process caches for nearly static database reads.
+
+Each LRUCache is bounded and thread-safe. Writers invalidate keys
+explicitly after their transaction commits; a load that raced with an
+invalidation is not stored, so a stale row never outlives the write that
+replaced it. Caches are per process: with several workers, a write is only
+seen immediately by the worker that made it.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+_MISSING = object()
+_registry = {}
+
+
+class LRUCache:
+    """Size-bounded least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, name, max_entries=CACHE_MAX_ENTRIES):
+        self.name = name
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _registry[name] = self
+
+    def get_or_load(self, key, loader):
+        """Cached value for key, calling loader() on a miss."""
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is not _MISSING:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            epoch = self._epoch
+        value = loader()
+        with self._lock:
+            if self._epoch == epoch:
+                self._store(key, value)
+        return value
+
+    def get(self, key, default=None):
+        """Cached value for key (counted as a hit or miss), or default."""
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value whose key can never go stale (e.g. one that embeds a version)."""
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._epoch += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def cache_stats():
+    """Stats of every cache, keyed by name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_caches():
+    for cache in _registry.values():
+        cache.clear()
@@ -1,13 +1,102 @@
 import sqlite3
 import os
+import json
 import hashlib
 import secrets
-
-DB_PATH = os.path.join(os.path.dirname(__file__), "rewards.db")
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from cache import LRUCache, clear_caches
+from metrics import db_timed
+from analytics import merge_counts, time_histogram
+from streaks import week_flags, week_mask
+
+DB_PATH = os.getenv("REWARDKEEPER_DB", os.path.join(os.path.dirname(__file__), "rewards.db"))
+
+# Connection tuning (overridable via environment)
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+
+# One long-lived connection per thread; every connection opened is tracked
+# so close_connections() can release them on shutdown. Bumping the generation
+# makes threads holding a closed connection reconnect on next use.
+_local = threading.local()
+_open_conns = []
+_open_conns_lock = threading.Lock()
+_generation = 0
+
+# Read-through caches for rows that rarely change; the writers below invalidate them
+_users_cache = LRUCache("users")
+_pv_settings_cache = LRUCache("pv_settings")
+_mappings_cache = LRUCache("student_mappings")
+
+
+def _connect():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
 
 
 def _get_conn():
-    return sqlite3.connect(DB_PATH)
+    """Return this thread's connection, opening it on first use.
+
+    Connections run in autocommit mode; writes go through _transaction().
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.key != (DB_PATH, _generation):
+        conn = _connect()
+        with _open_conns_lock:
+            _open_conns.append(conn)
+        _local.conn = conn
+        _local.key = (DB_PATH, _generation)
+    return conn
+
+
+@contextmanager
+def _transaction():
+    """Run the enclosed statements in one write transaction.
+
+    BEGIN IMMEDIATE takes the write lock up front so concurrent writers wait
+    on busy_timeout instead of failing mid-transaction. Nested use joins the
+    outer transaction.
+    """
+    conn = _get_conn()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def close_connections():
+    """Close every pooled connection (call on application shutdown)."""
+    global _generation
+    with _open_conns_lock:
+        conns = list(_open_conns)
+        _open_conns.clear()
+        _generation += 1
+    for conn in conns:
+        conn.close()
+    clear_caches()
 
 
 def _hash_password(password, salt=None):
@@ -17,9 +106,18 @@ def _hash_password(password, salt=None):
     return salt, hashed
 
 
-def init_db():
-    conn = _get_conn()
+# --- Schema migrations ---
+#
+# The schema version lives in PRAGMA user_version. Each migration runs once,
+# in order, inside the same transaction that bumps the version. Never edit a
+# released migration; append a new one instead.
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
 
+
+def _migrate_base_schema(conn):
+    """Create the original tables and upgrade pre-versioning layouts in place."""
     # Users table
     conn.execute(
         """
@@ -38,11 +136,11 @@ def init_db():
         """
     )
 
-    # Check if the old table exists without ta_name column — if so, drop and recreate
-    cursor = conn.execute("PRAGMA table_info(week_results)")
-    columns = [row[1] for row in cursor.fetchall()]
-    if columns and "ta_name" not in columns:
-        conn.execute("DROP TABLE week_results")
+    # Tables from before per-TA isolation lack ta_name; rebuild them with the
+    # rows kept under an empty ta_name instead of dropping them.
+    legacy_columns = _table_columns(conn, "week_results")
+    if legacy_columns and "ta_name" not in legacy_columns:
+        conn.execute("ALTER TABLE week_results RENAME TO week_results_legacy")
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS week_results (
@@ -58,6 +156,15 @@ def init_db():
         )
         """
     )
+    if legacy_columns and "ta_name" not in legacy_columns:
+        shared = [c for c in _table_columns(conn, "week_results") if c in legacy_columns and c != "id"]
+        cols = ", ".join(shared)
+        conn.execute(
+            f"INSERT OR REPLACE INTO week_results (ta_name, {cols}) "
+            f"SELECT '', {cols} FROM week_results_legacy"
+        )
+        conn.execute("DROP TABLE week_results_legacy")
+
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS week_meta (
@@ -70,12 +177,10 @@ def init_db():
         )
         """
     )
-    # Migrate early_submissions if missing time_taken column
-    cursor = conn.execute("PRAGMA table_info(early_submissions)")
-    es_columns = [row[1] for row in cursor.fetchall()]
+    # early_submissions from before time_taken existed just gains the column
+    es_columns = _table_columns(conn, "early_submissions")
     if es_columns and "time_taken" not in es_columns:
-        conn.execute("DROP TABLE early_submissions")
-
+        conn.execute("ALTER TABLE early_submissions ADD COLUMN time_taken REAL NOT NULL DEFAULT 0")
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS early_submissions (
@@ -127,41 +232,524 @@ def init_db():
         )
         """
     )
-    conn.commit()
-    conn.close()
 
 
-def save_week_results(ta_name, week, students_data):
-    """Save week results for all students under a specific TA.
+def _migrate_student_streaks(conn):
+    """Add the materialized streak table and build it from stored weeks."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS student_streaks (
+            ta_name TEXT NOT NULL,
+            student_name TEXT NOT NULL,
+            streak_length INTEGER NOT NULL DEFAULT 0,
+            can_streak INTEGER NOT NULL DEFAULT 0,
+            last_week INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (ta_name, student_name)
+        )
+        """
+    )
+    # A student's perfect weeks in order: the n-th is week n exactly while the
+    # run from week 1 is unbroken, so the streak is the count of such weeks
+    conn.execute(
+        """
+        WITH perfect AS (
+            SELECT ta_name, student_name, week,
+                   ROW_NUMBER() OVER (PARTITION BY ta_name, student_name ORDER BY week) AS n
+            FROM week_results WHERE both_perfect = 1
+        ),
+        streaks AS (
+            SELECT ta_name, student_name, SUM(week = n) AS streak
+            FROM perfect GROUP BY ta_name, student_name
+        ),
+        last AS (
+            SELECT ta_name, MAX(week) AS max_week FROM week_results GROUP BY ta_name
+        )
+        INSERT OR REPLACE INTO student_streaks (ta_name, student_name, streak_length, can_streak, last_week)
+        SELECT r.ta_name, r.student_name, COALESCE(s.streak, 0), COALESCE(s.streak, 0) = l.max_week, l.max_week
+        FROM (SELECT DISTINCT ta_name, student_name FROM week_results) r
+        JOIN last l ON l.ta_name = r.ta_name
+        LEFT JOIN streaks s ON s.ta_name = r.ta_name AND s.student_name = r.student_name
+        """
+    )
 
-    students_data: list of dicts with keys:
-        student_name, problem1_grade, problem2_grade, full_mark, both_perfect
-    """
-    conn = _get_conn()
-    for s in students_data:
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO week_results
-                (ta_name, week, student_name, problem1_grade, problem2_grade, full_mark, both_perfect)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
+
+def _migrate_query_indexes(conn):
+    """Covering indexes for the hot read paths."""
+    # Per-TA week scans: DISTINCT week, MAX(week), streak history and repair
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_week_results_ta_week "
+        "ON week_results (ta_name, week, both_perfect, student_name)"
+    )
+    # Per-TA, per-student lookups
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_week_results_ta_student "
+        "ON week_results (ta_name, student_name, week, both_perfect)"
+    )
+    # Streak candidates and reward lookups by minimum streak length
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_student_streaks_length "
+        "ON student_streaks (ta_name, streak_length, student_name)"
+    )
+    conn.execute("ANALYZE")
+
+
+def _migrate_problem_grades(conn):
+    """Store every problem's grade so a week can have any number of problems."""
+    conn.execute("ALTER TABLE week_results ADD COLUMN grades TEXT NOT NULL DEFAULT '[]'")
+    conn.execute("UPDATE week_results SET grades = '[' || problem1_grade || ', ' || problem2_grade || ']'")
+
+
+def _migrate_reward_send_items(conn):
+    """Per-student wallet adjustment status, so a retried send skips credited students."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reward_send_items (
+            ta_name TEXT NOT NULL,
+            week INTEGER NOT NULL,
+            pv_student_id TEXT NOT NULL,
+            rk_name TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT NOT NULL DEFAULT '',
+            updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+            PRIMARY KEY (ta_name, week, pv_student_id)
+        )
+        """
+    )
+
+
+def _migrate_pv_roster_cache(conn):
+    """Cached Prizeversity rosters, versioned so clients can fetch deltas."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pv_roster_meta (
+            classroom_id TEXT PRIMARY KEY,
+            etag TEXT NOT NULL DEFAULT '',
+            version INTEGER NOT NULL DEFAULT 0,
+            fetched_at REAL NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pv_roster_cache (
+            classroom_id TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            removed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (classroom_id, student_id)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pv_roster_cache_version "
+        "ON pv_roster_cache (classroom_id, version)"
+    )
+
+
+# Weeks 1..MASK_WEEKS fit in a signed 64-bit SQLite integer; later weeks are left out of the masks
+MASK_WEEKS = 63
+# week_results is keyed by week, so SUM over distinct bits is their OR
+_MASK_AGGREGATES = (
+    f"COALESCE(SUM(CASE WHEN both_perfect AND week <= {MASK_WEEKS} THEN 1 << (week - 1) END), 0), "
+    f"COALESCE(SUM(CASE WHEN week <= {MASK_WEEKS} THEN 1 << (week - 1) END), 0)"
+)
+
+
+def _migrate_student_roster(conn):
+    """Distinct students per TA with first/last week seen, built from stored weeks."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS student_roster (
+            ta_name TEXT NOT NULL,
+            student_name TEXT NOT NULL,
+            first_week INTEGER NOT NULL,
+            last_week INTEGER NOT NULL,
+            appearances INTEGER NOT NULL,
+            PRIMARY KEY (ta_name, student_name)
+        )
+        """
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO student_roster (ta_name, student_name, first_week, last_week, appearances) "
+        "SELECT ta_name, student_name, MIN(week), MAX(week), COUNT(*) FROM week_results GROUP BY ta_name, student_name"
+    )
+
+
+def _migrate_data_versions(conn):
+    """Per-TA counter bumped by every write to a TA's week data."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            ta_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def _migrate_week_masks(conn):
+    """Each student's term as bitmasks on student_roster: bit (week - 1) per week."""
+    conn.execute("ALTER TABLE student_roster ADD COLUMN perfect_mask INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE student_roster ADD COLUMN present_mask INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        "UPDATE student_roster SET "
+        "(perfect_mask, present_mask) = ("
+        f"SELECT {_MASK_AGGREGATES} FROM week_results w "
+        "WHERE w.ta_name = student_roster.ta_name AND w.student_name = student_roster.student_name)"
+    )
+
+
+def _migrate_analytics(conn):
+    """Rollup tables for /api/analytics, built from the stored weeks."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS week_stats (
+            ta_name TEXT NOT NULL,
+            week INTEGER NOT NULL,
+            students INTEGER NOT NULL,
+            passed INTEGER NOT NULL,
+            grade_sum REAL NOT NULL,
+            grade_possible REAL NOT NULL,
+            eligible INTEGER NOT NULL,
+            time_count INTEGER NOT NULL,
+            time_sum REAL NOT NULL,
+            time_hist TEXT NOT NULL,
+            PRIMARY KEY (ta_name, week)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS section_stats (
+            ta_name TEXT PRIMARY KEY,
+            weeks INTEGER NOT NULL,
+            students INTEGER NOT NULL,
+            student_weeks INTEGER NOT NULL,
+            passed INTEGER NOT NULL,
+            grade_sum REAL NOT NULL,
+            grade_possible REAL NOT NULL,
+            eligible INTEGER NOT NULL,
+            time_count INTEGER NOT NULL,
+            time_sum REAL NOT NULL,
+            time_hist TEXT NOT NULL,
+            perfect_weeks TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO week_stats (ta_name, week, students, passed, grade_sum, grade_possible,
+                                           eligible, time_count, time_sum, time_hist)
+        SELECT k.ta_name, k.week,
+               COALESCE(r.students, 0), COALESCE(r.passed, 0), COALESCE(r.grade_sum, 0),
+               COALESCE(r.grade_possible, 0), COALESCE(m.total_eligible, 0),
+               COALESCE(e.time_count, 0), COALESCE(e.time_sum, 0), '[]'
+        FROM (SELECT ta_name, week FROM week_results UNION SELECT ta_name, week FROM week_meta) k
+        LEFT JOIN (
+            SELECT ta_name, week, COUNT(*) AS students, SUM(both_perfect) AS passed,
+                   SUM((SELECT SUM(value) FROM json_each(grades))) AS grade_sum,
+                   SUM(full_mark * json_array_length(grades)) AS grade_possible
+            FROM week_results GROUP BY ta_name, week
+        ) r ON r.ta_name = k.ta_name AND r.week = k.week
+        LEFT JOIN week_meta m ON m.ta_name = k.ta_name AND m.week = k.week
+        LEFT JOIN (
+            SELECT ta_name, week, COUNT(*) AS time_count, SUM(time_taken) AS time_sum
+            FROM early_submissions GROUP BY ta_name, week
+        ) e ON e.ta_name = k.ta_name AND e.week = k.week
+        """
+    )
+    # Time histograms with the bucket bounds of this schema version
+    bounds = (5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 90, 120, 150, 180, 240, 300, 360, 480, 720, 1440)
+    week_hists, ta_hists = {}, {}
+    for ta_name, week, time_taken in conn.execute(
+        "SELECT e.ta_name, e.week, e.time_taken FROM early_submissions e "
+        "JOIN week_stats w ON w.ta_name = e.ta_name AND w.week = e.week"
+    ).fetchall():
+        bucket = bisect_left(bounds, time_taken)
+        for hists, key in ((week_hists, (ta_name, week)), (ta_hists, ta_name)):
+            hists.setdefault(key, [0] * (len(bounds) + 1))[bucket] += 1
+    conn.execute("UPDATE week_stats SET time_hist = ?", (json.dumps([0] * (len(bounds) + 1)),))
+    conn.executemany(
+        "UPDATE week_stats SET time_hist = ? WHERE ta_name = ? AND week = ?",
+        [(json.dumps(counts), ta_name, week) for (ta_name, week), counts in week_hists.items()],
+    )
+
+    # perfect_weeks[k] = students perfect in exactly k weeks
+    perfect_weeks = {}
+    for ta_name, mask in conn.execute("SELECT ta_name, perfect_mask FROM student_roster").fetchall():
+        counts = perfect_weeks.setdefault(ta_name, [])
+        k = mask.bit_count()
+        if k >= len(counts):
+            counts.extend([0] * (k + 1 - len(counts)))
+        counts[k] += 1
+    sections = conn.execute(
+        "SELECT ta_name, COUNT(*), SUM(students), SUM(passed), SUM(grade_sum), SUM(grade_possible), "
+        "SUM(eligible), SUM(time_count), SUM(time_sum) FROM week_stats GROUP BY ta_name"
+    ).fetchall()
+    conn.executemany(
+        "INSERT OR REPLACE INTO section_stats (ta_name, weeks, students, student_weeks, passed, grade_sum, "
+        "grade_possible, eligible, time_count, time_sum, time_hist, perfect_weeks) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
             (
-                ta_name,
-                week,
-                s["student_name"],
-                s["problem1_grade"],
-                s["problem2_grade"],
-                s["full_mark"],
-                1 if s["both_perfect"] else 0,
-            ),
+                ta_name, weeks, sum(perfect_weeks.get(ta_name, [])), *totals,
+                json.dumps(ta_hists.get(ta_name, [0] * (len(bounds) + 1))),
+                json.dumps(perfect_weeks.get(ta_name, [])),
+            )
+            for ta_name, weeks, *totals in sections
+        ],
+    )
+
+
+def _migrate_reward_send_chunks(conn):
+    """Remember the wallet chunk each student was sent in, so a retry resends it unchanged."""
+    conn.execute("ALTER TABLE reward_send_items ADD COLUMN chunk_key TEXT NOT NULL DEFAULT ''")
+
+
+def _migrate_roster_base_version(conn):
+    """First version of each cached roster; deltas are only served from it onwards."""
+    conn.execute("ALTER TABLE pv_roster_meta ADD COLUMN base_version INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_student_streaks,
+    _migrate_query_indexes,
+    _migrate_problem_grades,
+    _migrate_reward_send_items,
+    _migrate_pv_roster_cache,
+    _migrate_student_roster,
+    _migrate_data_versions,
+    _migrate_week_masks,
+    _migrate_analytics,
+    _migrate_reward_send_chunks,
+    _migrate_roster_base_version,
+]
+
+
+def _schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+@db_timed
+def init_db():
+    """Apply pending migrations. A no-op once the schema is current."""
+    if _schema_version(_get_conn()) >= len(MIGRATIONS):
+        return
+    with _transaction() as conn:
+        # Re-check under the write lock: another worker may have migrated
+        for version in range(_schema_version(conn), len(MIGRATIONS)):
+            MIGRATIONS[version](conn)
+            if not conn.in_transaction:
+                # e.g. executescript(), which commits first; the rest would run unguarded
+                raise RuntimeError(f"migration {MIGRATIONS[version].__name__} ended the migration transaction")
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+
+
+def _refresh_streaks(conn, ta_name, from_week, dropped=()):
+    """Repair a TA's student_streaks rows after weeks >= from_week changed.
+
+    A streak counts consecutive perfect weeks from week 1, so only students
+    whose streak reached from_week - 1 can be affected: their streak is cut
+    back to from_week - 1 and re-extended over the stored weeks that follow.
+    dropped lists students whose rows were removed; they lose their streak
+    row once no week references them.
+    """
+    from_week = max(from_week, 1)
+    max_week = conn.execute(
+        "SELECT MAX(week) FROM week_results WHERE ta_name = ?", (ta_name,)
+    ).fetchone()[0]
+    if max_week is None:
+        conn.execute("DELETE FROM student_streaks WHERE ta_name = ?", (ta_name,))
+        return
+
+    conn.executemany(
+        "DELETE FROM student_streaks WHERE ta_name = ? AND student_name = ? "
+        "AND NOT EXISTS (SELECT 1 FROM week_results WHERE ta_name = ? AND student_name = ?)",
+        [(ta_name, name, ta_name, name) for name in dropped],
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO student_streaks (ta_name, student_name) "
+        "SELECT DISTINCT ta_name, student_name FROM week_results WHERE ta_name = ? AND week >= ?",
+        (ta_name, from_week),
+    )
+
+    candidates = [
+        row[0] for row in conn.execute(
+            "SELECT student_name FROM student_streaks WHERE ta_name = ? AND streak_length >= ?",
+            (ta_name, from_week - 1),
+        )
+    ]
+    if candidates:
+        perfect = {}
+        for row in conn.execute(
+            "SELECT student_name, week FROM week_results "
+            "WHERE ta_name = ? AND week >= ? AND both_perfect = 1",
+            (ta_name, from_week),
+        ):
+            perfect.setdefault(row[0], set()).add(row[1])
+        updates = []
+        for name in candidates:
+            weeks = perfect.get(name, ())
+            streak = from_week - 1
+            while streak + 1 in weeks:
+                streak += 1
+            updates.append((streak, ta_name, name))
+        conn.executemany(
+            "UPDATE student_streaks SET streak_length = ? WHERE ta_name = ? AND student_name = ?",
+            updates,
         )
-    conn.commit()
-    conn.close()
 
+    conn.execute(
+        "UPDATE student_streaks SET last_week = ?, can_streak = (streak_length = ?) WHERE ta_name = ?",
+        (max_week, max_week, ta_name),
+    )
 
-def save_week_meta(ta_name, week, week_range, reward_points, total_eligible):
-    """Save metadata for a week computation."""
+
+def _bump_data_version(conn, ta_name):
+    # Counters start from the clock, so a recreated database never reissues an old version
+    conn.execute(
+        "INSERT INTO data_versions (ta_name, version) VALUES (?, ?) "
+        "ON CONFLICT (ta_name) DO UPDATE SET version = version + 1",
+        (ta_name, time.time_ns() // 1000),
+    )
+
+
+@db_timed
+def get_data_version(ta_name):
+    """Current version of a TA's week data; changes whenever it is written."""
     conn = _get_conn()
+    row = conn.execute("SELECT version FROM data_versions WHERE ta_name = ?", (ta_name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _refresh_student_roster(conn, ta_name, names):
+    """Recompute the student_roster rows (and week masks) of the given students from week_results."""
+    rows = [(ta_name, name) for name in names]
+    conn.executemany("DELETE FROM student_roster WHERE ta_name = ? AND student_name = ?", rows)
+    conn.executemany(
+        "INSERT INTO student_roster "
+        "(ta_name, student_name, first_week, last_week, appearances, perfect_mask, present_mask) "
+        f"SELECT ta_name, student_name, MIN(week), MAX(week), COUNT(*), {_MASK_AGGREGATES} FROM week_results "
+        "WHERE ta_name = ? AND student_name = ? GROUP BY ta_name, student_name",
+        rows,
+    )
+
+
+def _refresh_week_stats(conn, ta_name, week):
+    """Recompute a week's week_stats row from its results, meta and early submissions."""
+    students, passed, grade_sum, grade_possible = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(both_perfect), 0), "
+        "COALESCE(SUM((SELECT SUM(value) FROM json_each(grades))), 0), "
+        "COALESCE(SUM(full_mark * json_array_length(grades)), 0) "
+        "FROM week_results WHERE ta_name = ? AND week = ?",
+        (ta_name, week),
+    ).fetchone()
+    meta = conn.execute(
+        "SELECT total_eligible FROM week_meta WHERE ta_name = ? AND week = ?", (ta_name, week)
+    ).fetchone()
+    times = [
+        row[0] for row in conn.execute(
+            "SELECT time_taken FROM early_submissions WHERE ta_name = ? AND week = ?", (ta_name, week)
+        )
+    ]
+    if not students and meta is None and not times:
+        conn.execute("DELETE FROM week_stats WHERE ta_name = ? AND week = ?", (ta_name, week))
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO week_stats (ta_name, week, students, passed, grade_sum, grade_possible, "
+        "eligible, time_count, time_sum, time_hist) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (ta_name, week, students, passed, grade_sum, grade_possible, meta[0] if meta else 0,
+         len(times), sum(times), json.dumps(time_histogram(times))),
+    )
+
+
+def _refresh_section_stats(conn, ta_name):
+    """Re-total a TA's section_stats row from its week_stats rows and student_roster."""
+    weeks = conn.execute("SELECT * FROM week_stats WHERE ta_name = ?", (ta_name,)).fetchall()
+    if not weeks:
+        conn.execute("DELETE FROM section_stats WHERE ta_name = ?", (ta_name,))
+        return
+    perfect_weeks = []
+    for (mask,) in conn.execute("SELECT perfect_mask FROM student_roster WHERE ta_name = ?", (ta_name,)):
+        k = mask.bit_count()
+        if k >= len(perfect_weeks):
+            perfect_weeks.extend([0] * (k + 1 - len(perfect_weeks)))
+        perfect_weeks[k] += 1
+    conn.execute(
+        "INSERT OR REPLACE INTO section_stats (ta_name, weeks, students, student_weeks, passed, grade_sum, "
+        "grade_possible, eligible, time_count, time_sum, time_hist, perfect_weeks) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            ta_name,
+            len(weeks),
+            sum(perfect_weeks),
+            sum(w["students"] for w in weeks),
+            sum(w["passed"] for w in weeks),
+            sum(w["grade_sum"] for w in weeks),
+            sum(w["grade_possible"] for w in weeks),
+            sum(w["eligible"] for w in weeks),
+            sum(w["time_count"] for w in weeks),
+            sum(w["time_sum"] for w in weeks),
+            json.dumps(merge_counts(json.loads(w["time_hist"]) for w in weeks)),
+            json.dumps(perfect_weeks),
+        ),
+    )
+
+
+_INSERT_WEEK_RESULT = """
+    INSERT OR REPLACE INTO week_results
+        (ta_name, week, student_name, problem1_grade, problem2_grade, grades, full_mark, both_perfect)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_EARLY_SUBMISSION = """
+    INSERT INTO early_submissions (ta_name, week, rank, student_name, problem, submission_time, time_taken)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _week_result_rows(ta_name, week, students_data):
+    return [
+        (
+            ta_name,
+            week,
+            s["student_name"],
+            s["problem1_grade"],
+            s["problem2_grade"],
+            json.dumps(s.get("grades") or [s["problem1_grade"], s["problem2_grade"]]),
+            s["full_mark"],
+            1 if s["both_perfect"] else 0,
+        )
+        for s in students_data
+    ]
+
+
+def _week_student_names(conn, ta_name, week):
+    rows = conn.execute(
+        "SELECT student_name FROM week_results WHERE ta_name = ? AND week = ?",
+        (ta_name, week),
+    )
+    return {row[0] for row in rows}
+
+
+def _early_submission_rows(ta_name, week, top5):
+    return [
+        (ta_name, week, s["rank"], s["name"], s["problems"], s["submission_time"], s.get("time_taken", 0))
+        for s in top5
+    ]
+
+
+def _replace_week(conn, ta_name, week, students_data, week_range, reward_points, total_eligible, top5):
+    """Write one week's rows. Returns (old_names, new_names); streaks and section stats are left to the caller."""
+    old_names = _week_student_names(conn, ta_name, week)
+    conn.execute("DELETE FROM week_results WHERE ta_name = ? AND week = ?", (ta_name, week))
+    conn.executemany(_INSERT_WEEK_RESULT, _week_result_rows(ta_name, week, students_data))
+    new_names = {s["student_name"] for s in students_data}
+    _refresh_student_roster(conn, ta_name, old_names | new_names)
     conn.execute(
         """
         INSERT OR REPLACE INTO week_meta (ta_name, week, week_range, reward_points, total_eligible)
@@ -169,58 +757,121 @@ def save_week_meta(ta_name, week, week_range, reward_points, total_eligible):
         """,
         (ta_name, week, week_range, reward_points, total_eligible),
     )
-    conn.commit()
-    conn.close()
+    conn.execute("DELETE FROM early_submissions WHERE ta_name = ? AND week = ?", (ta_name, week))
+    conn.executemany(_INSERT_EARLY_SUBMISSION, _early_submission_rows(ta_name, week, top5))
+    _refresh_week_stats(conn, ta_name, week)
+    _bump_data_version(conn, ta_name)
+    return old_names, new_names
+
 
+@db_timed
+def save_week(ta_name, week, students_data, week_range, reward_points, total_eligible, top5):
+    """Replace everything stored for one week (results, meta, top 5) atomically.
 
+    The previous rows for the week are deleted first, so students missing from
+    a re-upload do not linger. Readers see either the old week or the new one.
+    """
+    with _transaction() as conn:
+        old_names, new_names = _replace_week(
+            conn, ta_name, week, students_data, week_range, reward_points, total_eligible, top5
+        )
+        _refresh_streaks(conn, ta_name, week, old_names - new_names)
+        _refresh_section_stats(conn, ta_name)
+
+
+@db_timed
+def save_weeks(ta_name, weeks):
+    """Replace several weeks in one transaction and repair streaks once.
+
+    weeks: list of dicts with the keyword arguments of save_week
+    (week, students_data, week_range, reward_points, total_eligible, top5).
+    """
+    if not weeks:
+        return
+    with _transaction() as conn:
+        dropped = set()
+        for w in weeks:
+            old_names, new_names = _replace_week(conn, ta_name, **w)
+            dropped |= old_names - new_names
+        _refresh_streaks(conn, ta_name, min(w["week"] for w in weeks), dropped)
+        _refresh_section_stats(conn, ta_name)
+
+
+@db_timed
+def save_week_results(ta_name, week, students_data):
+    """Save week results for all students under a specific TA.
+
+    students_data: list of dicts with keys:
+        student_name, problem1_grade, problem2_grade, full_mark, both_perfect
+        and optionally grades (all problems; defaults to the first two)
+    """
+    with _transaction() as conn:
+        conn.executemany(_INSERT_WEEK_RESULT, _week_result_rows(ta_name, week, students_data))
+        _refresh_streaks(conn, ta_name, week)
+        _refresh_student_roster(conn, ta_name, {s["student_name"] for s in students_data})
+        _refresh_week_stats(conn, ta_name, week)
+        _refresh_section_stats(conn, ta_name)
+        _bump_data_version(conn, ta_name)
+
+
+@db_timed
+def save_week_meta(ta_name, week, week_range, reward_points, total_eligible):
+    """Save metadata for a week computation."""
+    with _transaction() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO week_meta (ta_name, week, week_range, reward_points, total_eligible)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (ta_name, week, week_range, reward_points, total_eligible),
+        )
+        _refresh_week_stats(conn, ta_name, week)
+        _refresh_section_stats(conn, ta_name)
+        _bump_data_version(conn, ta_name)
+
+
+@db_timed
 def save_early_submissions(ta_name, week, top5):
     """Save the early submission top 5 for a week.
 
     top5: list of dicts with rank, name, problems, submission_time
     """
-    conn = _get_conn()
-    # Clear old data for this week first
-    conn.execute(
-        "DELETE FROM early_submissions WHERE ta_name = ? AND week = ?",
-        (ta_name, week),
-    )
-    for s in top5:
+    with _transaction() as conn:
+        # Clear old data for this week first
         conn.execute(
-            """
-            INSERT INTO early_submissions (ta_name, week, rank, student_name, problem, submission_time, time_taken)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (ta_name, week, s["rank"], s["name"], s["problems"], s["submission_time"], s.get("time_taken", 0)),
+            "DELETE FROM early_submissions WHERE ta_name = ? AND week = ?",
+            (ta_name, week),
         )
-    conn.commit()
-    conn.close()
+        conn.executemany(_INSERT_EARLY_SUBMISSION, _early_submission_rows(ta_name, week, top5))
+        _refresh_week_stats(conn, ta_name, week)
+        _refresh_section_stats(conn, ta_name)
+        _bump_data_version(conn, ta_name)
 
 
+@db_timed
 def get_week_meta(ta_name, week):
     """Return week metadata or None."""
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
     row = conn.execute(
         "SELECT * FROM week_meta WHERE ta_name = ? AND week = ?",
         (ta_name, week),
     ).fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
+@db_timed
 def get_early_submissions(ta_name, week):
     """Return saved early submissions for a week."""
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
     rows = conn.execute(
         "SELECT rank, student_name, problem, submission_time, time_taken "
         "FROM early_submissions WHERE ta_name = ? AND week = ? ORDER BY rank",
         (ta_name, week),
     ).fetchall()
-    conn.close()
     return [dict(row) for row in rows]
 
 
+@db_timed
 def get_streak_history(ta_name, up_to_week):
     """Return per-student, per-week both_perfect status from week 1 to up_to_week.
 
@@ -232,45 +883,141 @@ def get_streak_history(ta_name, up_to_week):
     streak_length is the count of consecutive perfect weeks from week 1.
     """
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
 
     rows = conn.execute(
         "SELECT week, student_name, both_perfect "
         "FROM week_results WHERE ta_name = ? AND week <= ? ORDER BY week",
         (ta_name, up_to_week),
     ).fetchall()
-    conn.close()
 
-    # Build per-student history
+    # Build per-student history: the set of perfect weeks of every student seen
     history = {}
     for row in rows:
-        name = row["student_name"]
-        if name not in history:
-            history[name] = {}
-        history[name][row["week"]] = bool(row["both_perfect"])
+        perfect = history.setdefault(row["student_name"], set())
+        if row["both_perfect"]:
+            perfect.add(row["week"])
+
+    streaks = {s["name"]: s for s in get_student_streaks(ta_name, up_to_week)}
 
     result = []
     for name in sorted(history.keys()):
-        weeks_map = history[name]
-        # streak_length = consecutive perfect weeks from week 1
-        streak = 0
-        for w in range(1, up_to_week + 1):
-            if weeks_map.get(w, False):
-                streak += 1
-            else:
-                break
-        # can_streak = all computed weeks so far are perfect
-        can_streak = streak == up_to_week
+        streak = streaks.get(name, {"can_streak": False, "streak_length": 0})
         result.append({
             "name": name,
-            "weeks": {w: weeks_map.get(w, False) for w in range(1, up_to_week + 1)},
-            "can_streak": can_streak,
+            "weeks": week_flags(week_mask(history[name]), up_to_week),
+            "can_streak": streak["can_streak"],
+            "streak_length": streak["streak_length"],
+        })
+
+    return result
+
+
+def _like_prefix(prefix):
+    """LIKE pattern matching names that start with prefix (case-insensitively)."""
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+@db_timed
+def get_streak_page(ta_name, up_to_week, after="", limit=500, prefix="", can_streak=None, min_length=0):
+    """One page of get_streak_history: up to limit students named after `after`.
+
+    Keyset-paginated by name, so each page costs the same however deep it
+    is. prefix filters names case-insensitively; can_streak and min_length
+    filter on the stored streak as of up_to_week. Entries have the same
+    shape as get_streak_history's.
+    """
+    if min_length > up_to_week:
+        return []
+    conn = _get_conn()
+    query = (
+        "SELECT r.student_name, MIN(COALESCE(s.streak_length, 0), ?) AS streak_length "
+        "FROM student_roster r LEFT JOIN student_streaks s "
+        "ON s.ta_name = r.ta_name AND s.student_name = r.student_name "
+        "WHERE r.ta_name = ? AND r.first_week <= ? AND r.student_name > ?"
+    )
+    params = [up_to_week, ta_name, up_to_week, after]
+    if prefix:
+        query += " AND r.student_name LIKE ? ESCAPE '\\'"
+        params.append(_like_prefix(prefix))
+    if min_length > 0:
+        query += " AND COALESCE(s.streak_length, 0) >= ?"
+        params.append(min_length)
+    if can_streak is not None:
+        query += " AND COALESCE(s.streak_length, 0) " + (">= ?" if can_streak else "< ?")
+        params.append(up_to_week)
+    query += " ORDER BY r.student_name LIMIT ?"
+    params.append(limit)
+    students = conn.execute(query, params).fetchall()
+    if not students:
+        return []
+
+    # One range scan over the page's names on idx_week_results_ta_student
+    rows = conn.execute(
+        "SELECT student_name, week, both_perfect FROM week_results "
+        "WHERE ta_name = ? AND student_name BETWEEN ? AND ? AND week <= ?",
+        (ta_name, students[0]["student_name"], students[-1]["student_name"], up_to_week),
+    ).fetchall()
+    perfect = {}
+    for row in rows:
+        if row["both_perfect"]:
+            perfect.setdefault(row["student_name"], set()).add(row["week"])
+
+    result = []
+    for row in students:
+        name, streak = row["student_name"], row["streak_length"]
+        result.append({
+            "name": name,
+            "weeks": week_flags(week_mask(perfect.get(name, ())), up_to_week),
+            "can_streak": streak == up_to_week,
             "streak_length": streak,
         })
+    return result
 
+
+def iter_streak_pages(ta_name, up_to_week, page_size=500, after="", **filters):
+    """Yield get_streak_history in pages of page_size entries (see get_streak_page).
+
+    Each page is fetched in full when it is requested, so consecutive pages
+    may be read from different threads.
+    """
+    while True:
+        page = get_streak_page(ta_name, up_to_week, after, page_size, **filters)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = page[-1]["name"]
+
+
+@db_timed
+def get_student_streaks(ta_name, up_to_week, min_length=0):
+    """Return stored streaks as of up_to_week, sorted by name.
+
+    Reads the maintained student_streaks table instead of replaying the term.
+    Only students with streak_length >= min_length are returned.
+
+    Returns a list of dicts: [{ name, streak_length: int, can_streak: bool }]
+    """
+    if min_length > up_to_week:
+        return []
+    conn = _get_conn()
+    rows = conn.execute(
+        "SELECT student_name, streak_length FROM student_streaks "
+        "WHERE ta_name = ? AND streak_length >= ? ORDER BY student_name",
+        (ta_name, min_length),
+    ).fetchall()
+    result = []
+    for row in rows:
+        streak = min(row["streak_length"], up_to_week)
+        result.append({
+            "name": row["student_name"],
+            "streak_length": streak,
+            "can_streak": streak == up_to_week,
+        })
     return result
 
 
+@db_timed
 def get_max_week(ta_name):
     """Return the highest week number stored for a TA, or 0 if none."""
     conn = _get_conn()
@@ -278,10 +1025,10 @@ def get_max_week(ta_name):
         "SELECT MAX(week) FROM week_results WHERE ta_name = ?",
         (ta_name,),
     ).fetchone()
-    conn.close()
     return row[0] if row[0] is not None else 0
 
 
+@db_timed
 def get_weeks_with_data(ta_name):
     """Return a sorted list of week numbers that have stored data for a TA."""
     conn = _get_conn()
@@ -289,163 +1036,471 @@ def get_weeks_with_data(ta_name):
         "SELECT DISTINCT week FROM week_results WHERE ta_name = ? ORDER BY week",
         (ta_name,),
     ).fetchall()
-    conn.close()
     return [row[0] for row in rows]
 
 
+@db_timed
 def get_week_results(ta_name, week):
     """Return stored student results for a specific week.
 
     Returns a list of dicts with student_name, problem1_grade, problem2_grade,
-    full_mark, both_perfect.  Returns empty list if no data.
+    grades (one entry per problem), full_mark, both_perfect.
+    Returns empty list if no data.
     """
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
     rows = conn.execute(
-        "SELECT student_name, problem1_grade, problem2_grade, full_mark, both_perfect "
+        "SELECT student_name, problem1_grade, problem2_grade, grades, full_mark, both_perfect "
         "FROM week_results WHERE ta_name = ? AND week = ? ORDER BY student_name",
         (ta_name, week),
     ).fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    results = []
+    for row in rows:
+        r = dict(row)
+        r["grades"] = json.loads(r["grades"])
+        results.append(r)
+    return results
 
 
+@db_timed
 def delete_week_data(ta_name, week):
     """Delete stored data for a single week for a TA."""
+    with _transaction() as conn:
+        old_names = _week_student_names(conn, ta_name, week)
+        conn.execute("DELETE FROM week_results WHERE ta_name = ? AND week = ?", (ta_name, week))
+        conn.execute("DELETE FROM week_meta WHERE ta_name = ? AND week = ?", (ta_name, week))
+        conn.execute("DELETE FROM early_submissions WHERE ta_name = ? AND week = ?", (ta_name, week))
+        _refresh_streaks(conn, ta_name, week, old_names)
+        _refresh_student_roster(conn, ta_name, old_names)
+        _refresh_week_stats(conn, ta_name, week)
+        _refresh_section_stats(conn, ta_name)
+        _bump_data_version(conn, ta_name)
+
+
+@db_timed
+def reset_db(ta_name):
+    """Delete all saved week results for a specific TA."""
+    with _transaction() as conn:
+        conn.execute("DELETE FROM week_results WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM week_meta WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM early_submissions WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM reward_send_log WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM reward_send_items WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM student_streaks WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM student_roster WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM week_stats WHERE ta_name = ?", (ta_name,))
+        conn.execute("DELETE FROM section_stats WHERE ta_name = ?", (ta_name,))
+        _bump_data_version(conn, ta_name)
+
+
+@db_timed
+def get_student_roster(ta_name, prefix="", limit=None):
+    """Students seen for a TA, by name: first/last week and number of weeks.
+
+    prefix filters names case-insensitively (for autocomplete).
+    """
     conn = _get_conn()
-    conn.execute("DELETE FROM week_results WHERE ta_name = ? AND week = ?", (ta_name, week))
-    conn.execute("DELETE FROM week_meta WHERE ta_name = ? AND week = ?", (ta_name, week))
-    conn.execute("DELETE FROM early_submissions WHERE ta_name = ? AND week = ?", (ta_name, week))
-    conn.commit()
-    conn.close()
+    query = (
+        "SELECT student_name, first_week, last_week, appearances FROM student_roster "
+        "WHERE ta_name = ?"
+    )
+    params = [ta_name]
+    if prefix:
+        query += " AND student_name LIKE ? ESCAPE '\\'"
+        params.append(_like_prefix(prefix))
+    query += " ORDER BY student_name"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+
+@db_timed
+def get_week_masks(ta_name, up_to_week):
+    """(name, perfect_mask, present_mask) of every student seen by up_to_week, by name.
+
+    Bit (week - 1) of perfect_mask is set when both problems were perfect
+    that week, and of present_mask when the student has a row for it (see
+    streaks.py for the rules evaluated on them).
+    """
+    conn = _get_conn()
+    return [
+        tuple(row) for row in conn.execute(
+            "SELECT student_name, perfect_mask, present_mask FROM student_roster "
+            "WHERE ta_name = ? AND first_week <= ? ORDER BY student_name",
+            (ta_name, up_to_week),
+        )
+    ]
 
 
-def reset_db(ta_name):
-    """Delete all saved week results for a specific TA."""
+def _stats_row(row, *json_columns):
+    stats = dict(row)
+    for column in json_columns:
+        stats[column] = json.loads(stats[column])
+    return stats
+
+
+@db_timed
+def get_week_stats(ta_name):
+    """week_stats rows of a TA by week (histograms decoded)."""
     conn = _get_conn()
-    conn.execute("DELETE FROM week_results WHERE ta_name = ?", (ta_name,))
-    conn.execute("DELETE FROM week_meta WHERE ta_name = ?", (ta_name,))
-    conn.execute("DELETE FROM early_submissions WHERE ta_name = ?", (ta_name,))
-    conn.execute("DELETE FROM reward_send_log WHERE ta_name = ?", (ta_name,))
-    conn.commit()
-    conn.close()
+    rows = conn.execute(
+        "SELECT * FROM week_stats WHERE ta_name = ? ORDER BY week", (ta_name,)
+    ).fetchall()
+    return [_stats_row(row, "time_hist") for row in rows]
+
+
+@db_timed
+def get_section_stats(ta_names):
+    """section_stats rows of the given TAs that have data, in the order given."""
+    ta_names = list(ta_names)
+    if not ta_names:
+        return []
+    conn = _get_conn()
+    rows = conn.execute(
+        f"SELECT * FROM section_stats WHERE ta_name IN ({', '.join('?' * len(ta_names))})", ta_names
+    ).fetchall()
+    by_ta = {row["ta_name"]: _stats_row(row, "time_hist", "perfect_weeks") for row in rows}
+    return [by_ta[ta] for ta in ta_names if ta in by_ta]
+
+
+@db_timed
+def get_report_problem_count(ta_name):
+    """Most problems in any stored week of a TA (the report's grade columns)."""
+    conn = _get_conn()
+    row = conn.execute(
+        "SELECT MAX(json_array_length(grades)) FROM week_results WHERE ta_name = ?", (ta_name,)
+    ).fetchone()
+    return row[0] or 0
+
+
+@db_timed
+def get_report_chunk(ta_name, after=(0, ""), limit=1000):
+    """Up to limit term-report rows after the (week, student_name) key `after`.
+
+    One row per student per stored week, by week and name:
+        (week, student_name, grades, full_mark, both_perfect, early_rank,
+         time_taken, perfect_mask, reward_points, bits_sent)
+    early_rank and time_taken are None outside the week's top 5; bits_sent
+    totals the wallet adjustments sent to the student for that week.
+    """
+    conn = _get_conn()
+    rows = conn.execute(
+        """
+        SELECT r.week, r.student_name, r.grades, r.full_mark, r.both_perfect,
+               e.rank, e.time_taken, COALESCE(s.perfect_mask, 0), m.reward_points, COALESCE(i.bits, 0)
+        FROM week_results r
+        LEFT JOIN early_submissions e
+            ON e.ta_name = r.ta_name AND e.week = r.week AND e.student_name = r.student_name
+        LEFT JOIN student_roster s ON s.ta_name = r.ta_name AND s.student_name = r.student_name
+        LEFT JOIN week_meta m ON m.ta_name = r.ta_name AND m.week = r.week
+        LEFT JOIN (
+            SELECT week, rk_name, SUM(amount) AS bits FROM reward_send_items
+            WHERE ta_name = ? AND status = 'sent' GROUP BY week, rk_name
+        ) i ON i.week = r.week AND i.rk_name = r.student_name
+        WHERE r.ta_name = ? AND (r.week, r.student_name) > (?, ?)
+        ORDER BY r.week, r.student_name
+        LIMIT ?
+        """,
+        (ta_name, ta_name, after[0], after[1], limit),
+    ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def iter_report_chunks(ta_name, chunk_size=1000):
+    """Yield the whole term report in chunks of get_report_chunk rows.
+
+    Each chunk is its own keyset query, so memory stays at one chunk and
+    consecutive chunks may be read from different threads.
+    """
+    after = (0, "")
+    while True:
+        chunk = get_report_chunk(ta_name, after, chunk_size)
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1][:2]
 
 
 # --- Prizeversity Settings CRUD ---
 
+@db_timed
 def save_pv_settings(ta_name, api_key, classroom_id):
-    conn = _get_conn()
-    conn.execute(
-        "INSERT OR REPLACE INTO prizeversity_settings (ta_name, api_key, classroom_id) VALUES (?, ?, ?)",
-        (ta_name, api_key, classroom_id),
-    )
-    conn.commit()
-    conn.close()
+    with _transaction() as conn:
+        _invalidate_ta_roster(conn, ta_name)
+        _invalidate_roster(conn, classroom_id)
+        conn.execute(
+            "INSERT OR REPLACE INTO prizeversity_settings (ta_name, api_key, classroom_id) VALUES (?, ?, ?)",
+            (ta_name, api_key, classroom_id),
+        )
+    _pv_settings_cache.invalidate(ta_name)
 
 
-def get_pv_settings(ta_name):
+def _load_pv_settings(ta_name):
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
     row = conn.execute(
         "SELECT * FROM prizeversity_settings WHERE ta_name = ?", (ta_name,)
     ).fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
+@db_timed
+def get_pv_settings(ta_name):
+    settings = _pv_settings_cache.get_or_load(ta_name, lambda: _load_pv_settings(ta_name))
+    return dict(settings) if settings else None
+
+
+@db_timed
 def delete_pv_settings(ta_name):
+    with _transaction() as conn:
+        _invalidate_ta_roster(conn, ta_name)
+        conn.execute("DELETE FROM prizeversity_settings WHERE ta_name = ?", (ta_name,))
+    _pv_settings_cache.invalidate(ta_name)
+
+
+# --- Prizeversity Roster Cache ---
+
+def _invalidate_roster(conn, classroom_id):
+    conn.execute("UPDATE pv_roster_meta SET fetched_at = 0, etag = '' WHERE classroom_id = ?", (classroom_id,))
+
+
+def _invalidate_ta_roster(conn, ta_name):
+    row = conn.execute("SELECT classroom_id FROM prizeversity_settings WHERE ta_name = ?", (ta_name,)).fetchone()
+    if row:
+        _invalidate_roster(conn, row["classroom_id"])
+
+
+@db_timed
+def invalidate_roster(classroom_id):
+    """Force the next roster read to refetch. Cached rows are kept for deltas."""
+    with _transaction() as conn:
+        _invalidate_roster(conn, classroom_id)
+
+
+@db_timed
+def get_roster_meta(classroom_id):
     conn = _get_conn()
-    conn.execute("DELETE FROM prizeversity_settings WHERE ta_name = ?", (ta_name,))
-    conn.commit()
-    conn.close()
+    row = conn.execute("SELECT * FROM pv_roster_meta WHERE classroom_id = ?", (classroom_id,)).fetchone()
+    return dict(row) if row else None
+
+
+@db_timed
+def touch_roster(classroom_id, fetched_at):
+    """Mark the cached roster fresh after the API confirmed it is unchanged."""
+    with _transaction() as conn:
+        conn.execute("UPDATE pv_roster_meta SET fetched_at = ? WHERE classroom_id = ?", (fetched_at, classroom_id))
+
+
+def _roster_student_id(student):
+    return student.get("studentId") or student.get("userId") or student.get("_id")
+
+
+@db_timed
+def save_roster(classroom_id, students, etag, fetched_at):
+    """Diff a freshly fetched roster against the cache. Returns the roster version.
+
+    Added, changed and removed students are stamped with a new version;
+    removed students stay as tombstones so clients can apply deltas. Like
+    data_versions, a new roster's version starts from the clock, so a
+    recreated database never reissues a version a client already holds.
+    """
+    fresh = {}
+    for s in students:
+        sid = _roster_student_id(s)
+        if sid:
+            fresh[sid] = json.dumps(s, sort_keys=True)
+    with _transaction() as conn:
+        meta = conn.execute(
+            "SELECT version, base_version FROM pv_roster_meta WHERE classroom_id = ?", (classroom_id,)
+        ).fetchone()
+        if meta:
+            version, base_version = meta["version"], meta["base_version"]
+        else:
+            version = base_version = time.time_ns() // 1000
+        cached = {
+            row["student_id"]: (row["data"], row["removed"])
+            for row in conn.execute(
+                "SELECT student_id, data, removed FROM pv_roster_cache WHERE classroom_id = ?", (classroom_id,)
+            )
+        }
+        upserts = [(sid, data) for sid, data in fresh.items() if cached.get(sid) != (data, 0)]
+        removed = [sid for sid, (_, gone) in cached.items() if not gone and sid not in fresh]
+        if upserts or removed:
+            version += 1
+            conn.executemany(
+                "INSERT OR REPLACE INTO pv_roster_cache (classroom_id, student_id, data, version, removed) VALUES (?, ?, ?, ?, 0)",
+                [(classroom_id, sid, data, version) for sid, data in upserts],
+            )
+            conn.executemany(
+                "UPDATE pv_roster_cache SET removed = 1, version = ? WHERE classroom_id = ? AND student_id = ?",
+                [(version, classroom_id, sid) for sid in removed],
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO pv_roster_meta (classroom_id, etag, version, base_version, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (classroom_id, etag or "", version, base_version, fetched_at),
+        )
+    return version
+
+
+@db_timed
+def get_roster_students(classroom_id, since_version=None):
+    """Cached roster as (students, removed_ids).
+
+    With since_version, only students changed after that version are
+    returned, plus the ids removed since then.
+    """
+    conn = _get_conn()
+    if since_version is None:
+        rows = conn.execute(
+            "SELECT student_id, data, removed FROM pv_roster_cache WHERE classroom_id = ? AND removed = 0",
+            (classroom_id,),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT student_id, data, removed FROM pv_roster_cache WHERE classroom_id = ? AND version > ?",
+            (classroom_id, since_version),
+        ).fetchall()
+    students = [json.loads(row["data"]) for row in rows if not row["removed"]]
+    students.sort(key=lambda s: s.get("name", ""))
+    return students, sorted(row["student_id"] for row in rows if row["removed"])
 
 
 # --- Student Mappings CRUD ---
 
+@db_timed
 def save_student_mappings(ta_name, mappings):
     """Save student mappings (list of dicts with rk_name, pv_student_id, pv_name)."""
-    conn = _get_conn()
-    for m in mappings:
-        conn.execute(
-            "INSERT OR REPLACE INTO student_mappings (ta_name, rk_name, pv_student_id, pv_name) VALUES (?, ?, ?, ?)",
-            (ta_name, m["rk_name"], m["pv_student_id"], m["pv_name"]),
-        )
-    conn.commit()
-    conn.close()
+    with _transaction() as conn:
+        for m in mappings:
+            conn.execute(
+                "INSERT OR REPLACE INTO student_mappings (ta_name, rk_name, pv_student_id, pv_name) VALUES (?, ?, ?, ?)",
+                (ta_name, m["rk_name"], m["pv_student_id"], m["pv_name"]),
+            )
+    _mappings_cache.invalidate(ta_name)
 
 
-def get_student_mappings(ta_name):
+def _load_student_mappings(ta_name):
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
     rows = conn.execute(
         "SELECT rk_name, pv_student_id, pv_name FROM student_mappings WHERE ta_name = ? ORDER BY rk_name",
         (ta_name,),
     ).fetchall()
-    conn.close()
     return [dict(row) for row in rows]
 
 
+@db_timed
+def get_student_mappings(ta_name):
+    mappings = _mappings_cache.get_or_load(ta_name, lambda: _load_student_mappings(ta_name))
+    return [dict(m) for m in mappings]
+
+
+@db_timed
 def delete_student_mappings(ta_name):
-    conn = _get_conn()
-    conn.execute("DELETE FROM student_mappings WHERE ta_name = ?", (ta_name,))
-    conn.commit()
-    conn.close()
+    with _transaction() as conn:
+        conn.execute("DELETE FROM student_mappings WHERE ta_name = ?", (ta_name,))
+    _mappings_cache.invalidate(ta_name)
 
 
 # --- Reward Send Log CRUD ---
 
+@db_timed
 def save_reward_send_log(ta_name, week, sent_at, total_students, total_bits, description, status="dry_run"):
-    conn = _get_conn()
-    conn.execute(
-        """INSERT OR REPLACE INTO reward_send_log
-           (ta_name, week, sent_at, total_students, total_bits, description, status)
-           VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (ta_name, week, sent_at, total_students, total_bits, description, status),
-    )
-    conn.commit()
-    conn.close()
+    with _transaction() as conn:
+        conn.execute(
+            """INSERT OR REPLACE INTO reward_send_log
+               (ta_name, week, sent_at, total_students, total_bits, description, status)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (ta_name, week, sent_at, total_students, total_bits, description, status),
+        )
 
 
+@db_timed
 def get_reward_send_log(ta_name, week):
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
     row = conn.execute(
         "SELECT * FROM reward_send_log WHERE ta_name = ? AND week = ?",
         (ta_name, week),
     ).fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
+@db_timed
+def save_reward_send_items(ta_name, week, items, status="pending"):
+    """Record wallet updates about to be sent.
+
+    items: list of dicts with pv_student_id, rk_name, amount, idempotency_key
+    and chunk_key
+    """
+    with _transaction() as conn:
+        conn.executemany(
+            """INSERT OR REPLACE INTO reward_send_items
+               (ta_name, week, pv_student_id, rk_name, amount, idempotency_key, chunk_key, status, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))""",
+            [
+                (ta_name, week, i["pv_student_id"], i["rk_name"], i["amount"], i["idempotency_key"],
+                 i["chunk_key"], status)
+                for i in items
+            ],
+        )
+
+
+@db_timed
+def update_reward_send_items(ta_name, week, pv_student_ids, status, error=""):
+    """Set the outcome of a sent chunk for its students."""
+    with _transaction() as conn:
+        conn.executemany(
+            """UPDATE reward_send_items SET status = ?, error = ?, updated_at = datetime('now')
+               WHERE ta_name = ? AND week = ? AND pv_student_id = ?""",
+            [(status, error or "", ta_name, week, sid) for sid in pv_student_ids],
+        )
+
+
+@db_timed
+def get_reward_send_items(ta_name, week):
+    conn = _get_conn()
+    rows = conn.execute(
+        "SELECT pv_student_id, rk_name, amount, idempotency_key, chunk_key, status, error, updated_at "
+        "FROM reward_send_items WHERE ta_name = ? AND week = ? ORDER BY rk_name",
+        (ta_name, week),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
 # --- User Registration CRUD ---
 
+@db_timed
 def register_user(crn, password, ta_name, subject="", course="", title="", class_start_time="02:30:00 PM"):
     """Register a new user. Returns True on success, raises on duplicate CRN."""
     salt, hashed = _hash_password(password)
-    conn = _get_conn()
     try:
-        conn.execute(
-            """INSERT INTO users (crn, password_hash, password_salt, ta_name, subject, course, title, class_start_time)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (crn, hashed, salt, ta_name, subject, course, title, class_start_time),
-        )
-        conn.commit()
+        with _transaction() as conn:
+            conn.execute(
+                """INSERT INTO users (crn, password_hash, password_salt, ta_name, subject, course, title, class_start_time)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (crn, hashed, salt, ta_name, subject, course, title, class_start_time),
+            )
         return True
     except sqlite3.IntegrityError:
         raise ValueError("CRN already registered")
     finally:
-        conn.close()
+        _users_cache.invalidate(crn)
 
 
-def get_user_by_crn(crn):
-    """Return user dict or None."""
+def _load_user(crn):
     conn = _get_conn()
-    conn.row_factory = sqlite3.Row
     row = conn.execute("SELECT * FROM users WHERE crn = ?", (crn,)).fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
+@db_timed
+def get_user_by_crn(crn):
+    """Return user dict or None."""
+    user = _users_cache.get_or_load(crn, lambda: _load_user(crn))
+    return dict(user) if user else None
+
+
+@db_timed
 def verify_user_password(crn, password):
     """Check password against stored hash. Returns user dict or None."""
     user = get_user_by_crn(crn)
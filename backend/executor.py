@@ -0,0 +1,66 @@
+"""Run blocking work off the event loop.
+
+run_db sends SQLite calls, and reads of uploaded files, to a dedicated
+thread pool; each pool thread keeps its own connection (see db._get_conn). run_cpu sends reward
+computation and matching to a bounded CPU pool, which is a thread pool by
+default or a process pool with CPU_EXECUTOR=process. Process mode only
+accepts picklable arguments, so callers pass bytes rather than open files.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+DB_THREADS = int(os.getenv("DB_THREADS", "8"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(os.cpu_count() or 1, 4))))
+CPU_EXECUTOR = os.getenv("CPU_EXECUTOR", "thread")
+
+_db_pool = None
+_cpu_pool = None
+
+
+def cpu_uses_processes():
+    return CPU_EXECUTOR == "process"
+
+
+def _get_db_pool():
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = ThreadPoolExecutor(DB_THREADS, thread_name_prefix="rk-db")
+    return _db_pool
+
+
+def _get_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        if cpu_uses_processes():
+            _cpu_pool = ProcessPoolExecutor(CPU_WORKERS)
+        else:
+            _cpu_pool = ThreadPoolExecutor(CPU_WORKERS, thread_name_prefix="rk-cpu")
+    return _cpu_pool
+
+
+async def run_db(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) on the database thread pool."""
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_get_db_pool(), call)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) on the CPU pool."""
+    if cpu_uses_processes():
+        call = functools.partial(fn, *args, **kwargs)
+    else:
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_get_cpu_pool(), call)
+
+
+def shutdown_executors():
+    """Wait for queued work and stop both pools (call on application shutdown)."""
+    global _db_pool, _cpu_pool
+    for pool in (_cpu_pool, _db_pool):
+        if pool is not None:
+            pool.shutdown(wait=True)
+    _db_pool = _cpu_pool = None
@@ -0,0 +1,150 @@
+"""Term report export: CSV and XLSX streamed from db.iter_report_chunks.
+
+Both writers are generators of bytes that pull one chunk of rows at a
+time, so a report of any length is produced in constant memory. XLSX is
+written with the stdlib zipfile into an unseekable buffer (entries get
+data descriptors instead of sizes up front) and holds a single sheet of
+inline strings, which is all a spreadsheet needs to open it.
+"""
+
+import csv
+import io
+import json
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from streaks import run_from_start
+
+
+def report_columns(problem_count):
+    return (
+        ["Week", "Student"]
+        + [f"Problem {i}" for i in range(1, problem_count + 1)]
+        + ["Full Mark", "Both Perfect", "Early Rank", "Time Taken (min)", "Streak", "Reward Points", "Bits Sent"]
+    )
+
+
+def report_rows(chunks, problem_count):
+    """Turn db.get_report_chunk rows into report rows, chunk by chunk."""
+    for chunk in chunks:
+        rows = []
+        for week, name, grades, full_mark, perfect, rank, time_taken, mask, points, bits in chunk:
+            grades = json.loads(grades)
+            rows.append(
+                [week, name]
+                + grades + [None] * (problem_count - len(grades))
+                + [full_mark, "Y" if perfect else "N", rank, time_taken, run_from_start(mask, week), points, bits]
+            )
+        yield rows
+
+
+def csv_stream(columns, row_chunks):
+    """CSV bytes, one piece per chunk; starts with a BOM so Excel reads UTF-8."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for rows in row_chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+# --- XLSX ---
+
+class _Sink(io.RawIOBase):
+    """Unseekable write target whose contents are taken after each write batch."""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    "</workbook>"
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    "</Relationships>"
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = "</sheetData></worksheet>"
+
+
+def _cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xml_rows(rows):
+    return "".join("<row>" + "".join(_cell(v) for v in row) + "</row>" for row in rows)
+
+
+def xlsx_stream(columns, row_chunks, sheet_name="Report"):
+    """XLSX bytes, one piece per chunk."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _WORKBOOK.format(name=escape(sheet_name, {'"': "&quot;"})))
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((_SHEET_START + _xml_rows([columns])).encode("utf-8"))
+            for rows in row_chunks:
+                sheet.write(_xml_rows(rows).encode("utf-8"))
+                data = sink.take()
+                if data:
+                    yield data
+            sheet.write(_SHEET_END.encode("utf-8"))
+    yield sink.take()
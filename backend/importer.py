@@ -0,0 +1,107 @@
+"""Bulk import of many weeks of gradesheets from one zip archive.
+
+The week of each CSV comes from its path: a "week 3" / "week_03" / "Week-3"
+component anywhere in it, or a top-level directory named just "3". Within a
+week, files are taken in natural name order (problem1.csv, problem2.csv, ...
+problem10.csv). Weeks are computed independently, each as its own job on
+the shared CPU pool (executor.run_cpu), so one bad week does not stop the
+others.
+"""
+
+import io
+import re
+import zipfile
+import zlib
+
+from rewards import GradesheetError
+
+_WEEK_PATTERN = re.compile(r"week[\s_-]*0*(\d+)", re.IGNORECASE)
+_DIGITS = re.compile(r"(\d+)")
+
+
+def week_from_path(path):
+    """Week number encoded in an archive path, or None."""
+    match = _WEEK_PATTERN.search(path)
+    if match:
+        return int(match.group(1))
+    top = path.split("/")[0]
+    return int(top) if "/" in path and top.isdigit() else None
+
+
+def _natural_key(path):
+    return [int(part) if part.isdigit() else part.lower() for part in _DIGITS.split(path)]
+
+
+def read_archive(fileobj, max_member_bytes, max_total_bytes):
+    """Group the CSVs of a zip archive by week.
+
+    Returns ({week: [(path, bytes)]}, {week: error}, skipped paths). A week
+    with an oversized or unreadable file is left out and its error
+    recorded; only an invalid archive or one over max_total_bytes raises
+    GradesheetError.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise GradesheetError("not a valid zip archive")
+
+    weeks = {}
+    errors = {}
+    skipped = []
+    total = 0
+    with archive:
+        members = [m for m in archive.infolist() if not m.is_dir()]
+        for member in sorted(members, key=lambda m: _natural_key(m.filename)):
+            path = member.filename
+            name = path.rsplit("/", 1)[-1]
+            if path.startswith("__MACOSX/") or name.startswith("."):
+                continue
+            week = week_from_path(path)
+            if not name.lower().endswith(".csv") or week is None or week < 1:
+                skipped.append(path)
+                continue
+            if week in errors:
+                continue
+            if member.file_size > max_member_bytes:
+                errors[week] = f"{path} exceeds the {max_member_bytes}-byte upload limit"
+                continue
+            total += member.file_size
+            if total > max_total_bytes:
+                raise GradesheetError(f"archive exceeds the {max_total_bytes}-byte import limit")
+            try:
+                with archive.open(member) as f:
+                    data = f.read(max_member_bytes + 1)
+            except (zipfile.BadZipFile, NotImplementedError, RuntimeError, EOFError, OSError, zlib.error) as e:
+                # Corrupt, encrypted or unsupported member
+                errors[week] = f"{path} could not be read: {e}"
+                continue
+            if len(data) > max_member_bytes:
+                errors[week] = f"{path} exceeds the {max_member_bytes}-byte upload limit"
+                continue
+            weeks.setdefault(week, []).append((path, data))
+    for week in errors:
+        weeks.pop(week, None)
+    return weeks, errors, skipped
+
+
+def compute_week(job):
+    """Compute one week. Returns (week, result, error).
+
+    job is (week, files, engine, custom_groups, class_start_time, max_rows),
+    where files holds (name, bytes) pairs or (name, text stream) pairs; only
+    bytes can be sent to a worker process.
+    """
+    week, files, engine, custom_groups, class_start_time, max_rows = job
+    sheets = [
+        io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="") if isinstance(data, bytes) else data
+        for _, data in files
+    ]
+    try:
+        return week, engine(sheets, week, custom_groups, class_start_time, max_rows=max_rows), None
+    except UnicodeDecodeError:
+        return week, None, "Files must be valid UTF-8 CSV files"
+    except GradesheetError as e:
+        return week, None, f"Invalid gradesheet: {e}"
+    except Exception as e:
+        return week, None, f"Error processing CSV files: {e}"
+
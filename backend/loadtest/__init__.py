@@ -0,0 +1,7 @@
+"""Load testing for the RewardKeeper backend.
+
+mock_pv is a local stand-in for the Prizeversity integration API with
+injectable latency, errors and rate limits; scenarios drives the backend
+with concurrent TAs and reports latency percentiles and throughput.
+Run from the backend directory, e.g. ``python -m loadtest.scenarios --spawn``.
+"""
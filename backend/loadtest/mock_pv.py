@@ -0,0 +1,163 @@
+"""Local stand-in for the Prizeversity integration API.
+
+Serves /classroom, /users/list, /users/match and /wallet/adjust under
+/api/integrations, like the real service. Every classroom has the same
+synthetic roster (benchmarks.synth names, so uploaded gradesheets match).
+Latency, error rate and a global rate limit are set on the command line or
+through MOCK_PV_* environment variables:
+
+    python -m loadtest.mock_pv --port 9100 --latency-ms 80 --jitter-ms 40 \\
+        --error-rate 0.05 --rate-limit 200
+
+Then start the backend with PRIZEVERSITY_BASE_URL=http://127.0.0.1:9100/api/integrations.
+GET /_stats returns request counts and wallet totals.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from benchmarks.synth import student_names
+
+LATENCY_MS = float(os.getenv("MOCK_PV_LATENCY_MS", "50"))
+JITTER_MS = float(os.getenv("MOCK_PV_JITTER_MS", "20"))
+ERROR_RATE = float(os.getenv("MOCK_PV_ERROR_RATE", "0"))
+RATE_LIMIT = float(os.getenv("MOCK_PV_RATE_LIMIT", "0"))  # requests per second, 0 = unlimited
+STUDENTS = int(os.getenv("MOCK_PV_STUDENTS", "200"))
+
+_lock = threading.Lock()
+_stats = {"requests": {}, "errors": 0, "rate_limited": 0, "wallet_updates": 0, "wallet_duplicates": 0, "bits": 0}
+_idempotency_keys = set()
+_bucket = {"tokens": 0.0, "updated": time.monotonic()}
+
+
+def _roster():
+    return [
+        {"userId": f"u{i:05d}", "name": name, "email": f"student{i}@example.edu"}
+        for i, name in enumerate(student_names(STUDENTS))
+    ]
+
+
+_ROSTER = _roster()
+_ROSTER_ETAG = '"' + hashlib.sha1(repr(_ROSTER).encode()).hexdigest()[:16] + '"'
+_BY_NAME = {s["name"].lower(): s for s in _ROSTER}
+
+
+def _take_token():
+    """Token bucket refilled at RATE_LIMIT per second, one second of burst."""
+    if RATE_LIMIT <= 0:
+        return True
+    with _lock:
+        now = time.monotonic()
+        _bucket["tokens"] = min(RATE_LIMIT, _bucket["tokens"] + (now - _bucket["updated"]) * RATE_LIMIT)
+        _bucket["updated"] = now
+        if _bucket["tokens"] < 1:
+            return False
+        _bucket["tokens"] -= 1
+        return True
+
+
+app = FastAPI(title="Mock Prizeversity")
+api = APIRouter(prefix="/api/integrations")
+
+
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    if request.url.path.startswith("/_"):
+        return await call_next(request)
+    parts = request.url.path.removeprefix(api.prefix).strip("/").split("/")
+    route = "/" + "/".join(parts[:1] if parts[0] == "classroom" else parts[:2])
+    with _lock:
+        _stats["requests"][route] = _stats["requests"].get(route, 0) + 1
+    if not _take_token():
+        with _lock:
+            _stats["rate_limited"] += 1
+        return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+    delay = max(0.0, random.gauss(LATENCY_MS, JITTER_MS)) / 1000
+    await asyncio.sleep(delay)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        with _lock:
+            _stats["errors"] += 1
+        return JSONResponse({"error": "injected failure"}, status_code=503)
+    return await call_next(request)
+
+
+@api.get("/classroom/{classroom_id}")
+async def classroom(classroom_id: str):
+    return {"_id": classroom_id, "name": f"Mock {classroom_id}", "code": classroom_id[:6].upper(), "studentCount": len(_ROSTER)}
+
+
+@api.get("/users/list/{classroom_id}")
+async def list_users(classroom_id: str, request: Request):
+    if request.headers.get("if-none-match") == _ROSTER_ETAG:
+        return Response(status_code=304, headers={"ETag": _ROSTER_ETAG})
+    body = {"classroomId": classroom_id, "className": f"Mock {classroom_id}", "students": _ROSTER}
+    return JSONResponse(body, headers={"ETag": _ROSTER_ETAG})
+
+
+@api.post("/users/match")
+async def match_users(request: Request):
+    payload = await request.json()
+    matched, unmatched = [], []
+    for s in payload.get("students", []):
+        pv = _BY_NAME.get(s["name"].lower())
+        if pv:
+            matched.append({"name": pv["name"], "externalId": s["externalId"], "studentId": pv["userId"]})
+        else:
+            unmatched.append({"name": s["name"], "externalId": s["externalId"], "reason": "not found"})
+    return {"matched": matched, "unmatched": unmatched}
+
+
+@api.post("/wallet/adjust")
+async def wallet_adjust(request: Request):
+    payload = await request.json()
+    applied = 0
+    with _lock:
+        for update in payload.get("updates", []):
+            key = update.get("idempotencyKey")
+            if key and key in _idempotency_keys:
+                _stats["wallet_duplicates"] += 1
+                continue
+            if key:
+                _idempotency_keys.add(key)
+            _stats["wallet_updates"] += 1
+            _stats["bits"] += update.get("amount", 0)
+            applied += 1
+    return {"updated": applied, "classroomId": payload.get("classroomId")}
+
+
+@app.get("/_stats")
+async def stats():
+    with _lock:
+        return {**_stats, "requests": dict(_stats["requests"])}
+
+
+app.include_router(api)
+
+
+def main():
+    global LATENCY_MS, JITTER_MS, ERROR_RATE, RATE_LIMIT
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    parser.add_argument("--rate-limit", type=float, default=RATE_LIMIT, help="requests per second (0 = unlimited)")
+    args = parser.parse_args()
+    LATENCY_MS, JITTER_MS = args.latency_ms, args.jitter_ms
+    ERROR_RATE, RATE_LIMIT = args.error_rate, args.rate_limit
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
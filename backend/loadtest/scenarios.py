@@ -0,0 +1,265 @@
+"""Drive the backend with many concurrent TAs and report latency and throughput.
+
+Each simulated TA first uploads a few weeks, configures Prizeversity and
+saves its student mappings. Then `--concurrency` workers issue requests
+for `--duration` seconds, picking a random TA and an operation from the
+scenario's mix:
+
+    upload  POST /api/compute
+    read    GET /api/streak and /api/week-data
+    sync    POST /api/prizeversity/sync-students
+    send    POST /api/prizeversity/send-rewards (preview and live)
+    mixed   all of the above, mostly reads
+
+Against running servers (backend started with PRIZEVERSITY_BASE_URL
+pointing at loadtest.mock_pv):
+
+    python -m loadtest.scenarios mixed --backend http://127.0.0.1:8000
+
+Or let the harness start both, with a throwaway database:
+
+    python -m loadtest.scenarios mixed --spawn --pv-latency-ms 150 --pv-error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.synth import make_term
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "upload": {"upload": 1},
+    "read": {"streak": 1, "week_data": 1},
+    "sync": {"sync": 1},
+    "send": {"send": 1},
+    "mixed": {"upload": 1, "streak": 4, "week_data": 4, "sync": 1, "send": 1},
+}
+
+
+class Recorder:
+    """Latencies and failures per operation."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, op, seconds, ok):
+        self.latencies.setdefault(op, []).append(seconds)
+        if not ok:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def report(recorder, elapsed):
+    print(f"\n{'operation':<12} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>8}")
+    total = 0
+    for op in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[op])
+        total += len(values)
+        print(
+            f"{op:<12} {len(values):>7} {recorder.errors.get(op, 0):>7} "
+            f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f} "
+            f"{percentile(values, 99) * 1000:>9.1f} {values[-1] * 1000:>9.1f} {len(values) / elapsed:>8.1f}"
+        )
+    print(f"\n{total} requests in {elapsed:.1f} s: {total / elapsed:.1f} req/s")
+
+
+class TA:
+    def __init__(self, name, term):
+        self.name = name
+        self.term = term
+
+    def compute_files(self, week):
+        sheets = self.term[week - 1]
+        return {f"problem{i}": (f"problem{i}.csv", sheet) for i, sheet in enumerate(sheets[:2], 1)}
+
+
+async def _compute(client, ta, week):
+    return await client.post("/api/compute", data={"week": week, "ta_name": ta.name}, files=ta.compute_files(week))
+
+
+async def _post_ok(client, url, attempts=5, **kwargs):
+    """POST during setup, retrying the mock API's injected failures."""
+    for attempt in range(attempts):
+        r = await client.post(url, **kwargs)
+        if r.status_code < 400 or attempt == attempts - 1:
+            r.raise_for_status()
+            return r
+        await asyncio.sleep(0.2 * (attempt + 1))
+
+
+async def setup_ta(client, ta, weeks):
+    for week in range(1, weeks + 1):
+        (await _compute(client, ta, week)).raise_for_status()
+    await _post_ok(client, "/api/prizeversity/settings",
+                   json={"ta_name": ta.name, "classroom_id": f"class-{ta.name}", "api_key": "load"})
+    r = await _post_ok(client, "/api/prizeversity/sync-students", json={"ta_name": ta.name})
+    mappings = [{k: m[k] for k in ("rk_name", "pv_student_id", "pv_name")} for m in r.json()["matched"]]
+    await _post_ok(client, "/api/prizeversity/save-mappings", json={"ta_name": ta.name, "mappings": mappings})
+
+
+async def run_op(client, op, ta, weeks, rng):
+    week = rng.randint(1, weeks)
+    if op == "upload":
+        return await _compute(client, ta, week)
+    if op == "streak":
+        return await client.get(f"/api/streak/{ta.name}")
+    if op == "week_data":
+        return await client.get(f"/api/week-data/{ta.name}/{week}")
+    if op == "sync":
+        return await client.post("/api/prizeversity/sync-students", json={"ta_name": ta.name})
+    if op == "send":
+        body = {"ta_name": ta.name, "week": week, "dry_run": rng.random() < 0.5}
+        return await client.post("/api/prizeversity/send-rewards", json=body)
+    raise ValueError(op)
+
+
+async def drive(args):
+    rng = random.Random(args.seed)
+    tas = [
+        TA(f"load-{i:03d}", make_term(args.students, args.weeks, seed=i, attempts=2))
+        for i in range(args.tas)
+    ]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.backend, timeout=args.timeout, limits=limits) as client:
+        print(f"setting up {len(tas)} TAs ({args.students} students, {args.weeks} weeks each)...")
+        setup = asyncio.Semaphore(args.concurrency)
+
+        async def guarded_setup(ta):
+            async with setup:
+                await setup_ta(client, ta, args.weeks)
+
+        await asyncio.gather(*(guarded_setup(ta) for ta in tas))
+
+        mix = SCENARIOS[args.scenario]
+        ops, weights = list(mix), list(mix.values())
+        recorder = Recorder()
+        deadline = time.monotonic() + args.duration
+
+        async def worker(seed):
+            wrng = random.Random(seed)
+            while time.monotonic() < deadline:
+                op = wrng.choices(ops, weights)[0]
+                ta = wrng.choice(tas)
+                start = time.perf_counter()
+                try:
+                    resp = await run_op(client, op, ta, args.weeks, wrng)
+                    ok = resp.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                recorder.record(op, time.perf_counter() - start, ok)
+
+        print(f"running '{args.scenario}' with {args.concurrency} workers for {args.duration:.0f} s...")
+        start = time.monotonic()
+        await asyncio.gather(*(worker(rng.random()) for _ in range(args.concurrency)))
+        report(recorder, time.monotonic() - start)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server for {url} exited with status {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"timed out waiting for {url}")
+
+
+def spawn_servers(args):
+    """Start the mock Prizeversity API and the backend; returns the processes."""
+    pv_port, backend_port = _free_port(), _free_port()
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "loadtest.mock_pv", "--port", str(pv_port),
+         "--latency-ms", str(args.pv_latency_ms), "--jitter-ms", str(args.pv_jitter_ms),
+         "--error-rate", str(args.pv_error_rate), "--rate-limit", str(args.pv_rate_limit)],
+        cwd=BACKEND_DIR, env={**os.environ, "MOCK_PV_STUDENTS": str(args.students)},
+    )
+    env = {
+        **os.environ,
+        "PRIZEVERSITY_BASE_URL": f"http://127.0.0.1:{pv_port}/api/integrations",
+        "REWARDKEEPER_DB": os.path.join(tempfile.mkdtemp(), "loadtest.db"),
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(backend_port),
+         "--workers", str(args.backend_workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    procs = [mock, backend]
+    try:
+        _wait_ready(f"http://127.0.0.1:{pv_port}/_stats", mock)
+        _wait_ready(f"http://127.0.0.1:{backend_port}/api/weeks/ready", backend)
+    except BaseException:
+        stop_servers(procs)
+        raise
+    args.backend = f"http://127.0.0.1:{backend_port}"
+    args.mock = f"http://127.0.0.1:{pv_port}"
+    return procs
+
+
+def stop_servers(procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenario", choices=sorted(SCENARIOS), nargs="?", default="mixed")
+    parser.add_argument("--backend", default="http://127.0.0.1:8000")
+    parser.add_argument("--tas", type=int, default=10)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn", action="store_true", help="start the mock API and a backend on free ports")
+    parser.add_argument("--backend-workers", type=int, default=1)
+    parser.add_argument("--pv-latency-ms", type=float, default=50)
+    parser.add_argument("--pv-jitter-ms", type=float, default=20)
+    parser.add_argument("--pv-error-rate", type=float, default=0)
+    parser.add_argument("--pv-rate-limit", type=float, default=0)
+    args = parser.parse_args()
+
+    procs = spawn_servers(args) if args.spawn else []
+    try:
+        asyncio.run(drive(args))
+        if args.spawn:
+            print(f"\nmock Prizeversity: {httpx.get(args.mock + '/_stats').json()}")
+    finally:
+        stop_servers(procs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,62 @@
+import asyncio
+import base64
+import binascii
+import io
 import json
 import os
+import re
+import time
+import zlib
+from contextlib import asynccontextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from fastapi import FastAPI, File, Form, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from rewards import compute_rewards
-from prizeversity import PrizeversityClient
+from cache import LRUCache, cache_stats
+from metrics import MetricsMiddleware, render_metrics
+from wire import VARY, choose_encoding, encode, gzip_stream_compressor, size_hint, wants_compact
+from rewards import compute_week_rewards, GradesheetError
+from streaks import streak_stats, count_in_window
+from analytics import section_summary, week_summary
+from export import csv_stream, report_columns, report_rows, xlsx_stream
+from importer import read_archive, compute_week
+from matching import assign_matches, shortlist_names
+from executor import CPU_WORKERS, run_db, run_cpu, cpu_uses_processes, shutdown_executors
+from rewards_columnar import columnar_available, compute_week_rewards_columnar
+from prizeversity import (
+    PrizeversityClient, get_http_client, close_http_client, wallet_idempotency_key, assign_wallet_chunks,
+)
 from db import (
-    init_db, save_week_results, get_streak_history, get_max_week, reset_db,
-    get_weeks_with_data, get_week_results, delete_week_data,
-    save_week_meta, save_early_submissions, get_week_meta, get_early_submissions,
+    init_db, save_week, save_weeks, get_streak_history, get_streak_page, iter_streak_pages, get_student_streaks, get_max_week, reset_db,
+    get_weeks_with_data, get_week_results, delete_week_data, get_student_roster,
+    get_week_meta, get_early_submissions, get_data_version, get_week_masks, MASK_WEEKS,
+    get_week_stats, get_section_stats, get_report_problem_count, iter_report_chunks,
     save_pv_settings, get_pv_settings, delete_pv_settings,
+    get_roster_meta, get_roster_students, save_roster, touch_roster, invalidate_roster,
     save_student_mappings, get_student_mappings, delete_student_mappings,
     save_reward_send_log, get_reward_send_log,
+    save_reward_send_items, update_reward_send_items, get_reward_send_items,
     register_user, verify_user_password, get_user_by_crn,
+    close_connections,
 )
 
-app = FastAPI(title="RewardKeeper API")
+
+@asynccontextmanager
+async def lifespan(app):
+    get_http_client()
+    yield
+    await close_http_client()
+    shutdown_executors()
+    close_connections()
+
+
+app = FastAPI(title="RewardKeeper API", lifespan=lifespan)
 
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:5174").split(",")
 
@@ -31,6 +66,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Load allowed CRNs from config
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
@@ -38,8 +74,97 @@ with open(CONFIG_PATH) as f:
     CONFIG = json.load(f)
 ALLOWED_CRNS = {entry["crn"]: entry for entry in CONFIG["allowed_crns"]}
 
+# Upload limits for gradesheet CSVs
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_UPLOAD_ROWS = int(os.getenv("MAX_UPLOAD_ROWS", "50000"))
+MAX_PROBLEMS = int(os.getenv("MAX_PROBLEMS", "10"))
+MAX_IMPORT_BYTES = int(os.getenv("MAX_IMPORT_BYTES", str(200 * 1024 * 1024)))
+
+# Reward engine: "dict", "columnar" (needs numpy) or "auto", which switches
+# to the columnar engine once a week's uploads exceed COLUMNAR_MIN_BYTES
+REWARDS_ENGINE = os.getenv("REWARDS_ENGINE", "auto")
+COLUMNAR_MIN_BYTES = int(os.getenv("COLUMNAR_MIN_BYTES", str(1024 * 1024)))
+
+# Seconds a cached Prizeversity roster is served before it is revalidated
+PV_ROSTER_TTL = float(os.getenv("PV_ROSTER_TTL", "600"))
+
+# Local student matching is split into this many CPU pool jobs for cohorts
+# of at least MATCH_SPLIT_MIN_NAMES names
+MATCH_JOBS = int(os.getenv("PV_MATCH_JOBS", str(CPU_WORKERS)))
+MATCH_SPLIT_MIN_NAMES = int(os.getenv("PV_MATCH_SPLIT_MIN_NAMES", "2000"))
+
+# Rendered GET responses keyed by TA data version; stale versions age out of the LRU
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "256"))
+_response_cache = LRUCache("responses", RESPONSE_CACHE_ENTRIES)
+
+# Rows per SQLite query (and per streamed piece) of /api/export
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Responses with more list entries than this (see wire.size_hint) are
+# encoded on the CPU pool instead of the event loop
+ENCODE_INLINE_MAX_ITEMS = int(os.getenv("ENCODE_INLINE_MAX_ITEMS", "200"))
+
+# Students per page of /api/streak (default and maximum); NDJSON streams in pages of the maximum
+STREAK_PAGE_DEFAULT = int(os.getenv("STREAK_PAGE_DEFAULT", "100"))
+STREAK_PAGE_MAX = int(os.getenv("STREAK_PAGE_MAX", "1000"))
+
 init_db()
 
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def _encode(content, compact_format, encoding):
+    """(body, headers) of content in the negotiated format and content coding.
+
+    Large bodies are serialized and compressed on the CPU pool rather than
+    on the event loop.
+    """
+    if size_hint(content) > ENCODE_INLINE_MAX_ITEMS:
+        return await run_cpu(encode, content, compact_format, encoding)
+    return encode(content, compact_format, encoding)
+
+
+async def _encoded_response(request: Request, content):
+    """Response for content, compact and/or compressed as the client asked."""
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    body, headers = await _encode(content, wants_compact(request), encoding)
+    return Response(body, headers=headers)
+
+
+async def _versioned_response(request: Request, ta_name, build):
+    """Serve a read-only view of a TA's data with a strong ETag.
+
+    The ETag is the TA's data version (tagged with the negotiated format and
+    content coding), so If-None-Match is answered with 304 before any query
+    runs. Otherwise the encoded body comes from the response cache, and
+    build() (an async callable returning the JSON content) only runs on a miss.
+    """
+    compact_format = wants_compact(request)
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    version = await run_db(get_data_version, ta_name)
+    etag = f'"{version}{"-compact" if compact_format else ""}{f"-{encoding}" if encoding else ""}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": VARY}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    key = (ta_name, version, request.url.path, str(request.query_params), compact_format, encoding)
+    cached = _response_cache.get(key)
+    if cached is None:
+        cached = await _encode(await build(), compact_format, encoding)
+        _response_cache.put(key, cached)
+    body, content_headers = cached
+    return Response(body, headers={**content_headers, **headers})
+
+
 @app.post("/api/register")
 async def register(
     crn: str = Form(...),
@@ -58,7 +183,7 @@ async def register(
     if len(password) < 4:
         raise HTTPException(status_code=400, detail="Password must be at least 4 characters")
     try:
-        register_user(crn, password, ta_name.strip(), subject.strip(), course.strip(), title.strip(), class_start_time.strip())
+        await run_db(register_user, crn, password, ta_name.strip(), subject.strip(), course.strip(), title.strip(), class_start_time.strip())
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     return {
@@ -74,7 +199,7 @@ async def register(
 async def login(crn: str = Form(...), password: str = Form(...)):
     crn = crn.strip()
     # First check registered users in DB
-    user = verify_user_password(crn, password)
+    user = await run_db(verify_user_password, crn, password)
     if user:
         course_info = f"{user['subject']} {user['course']} — {user['title']}".strip(" —")
         return {
@@ -106,12 +231,100 @@ async def login(crn: str = Form(...), password: str = Form(...)):
 
 
 @app.get("/api/streak/{ta_name}")
-async def streak(ta_name: str):
-    max_week = get_max_week(ta_name)
+async def streak(
+    request: Request,
+    ta_name: str,
+    cursor: str = "",
+    limit: int | None = None,
+    prefix: str = "",
+    can_streak: bool | None = None,
+    min_length: int = 0,
+    format: str = "json",
+):
+    """Streak history for a TA.
+
+    Without query parameters the whole history is returned. With limit,
+    cursor or a filter (prefix, can_streak, min_length) it is paginated by
+    name: pass next_cursor back as cursor for the following page.
+    format=ndjson (or Accept: application/x-ndjson) streams one student per
+    line instead, and format=compact returns the compact format (see wire.py).
+    """
+    filters = {"prefix": prefix.strip(), "can_streak": can_streak, "min_length": min_length}
+    after = _decode_cursor(cursor)
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        return await _streak_ndjson(request, ta_name, after, filters)
+    if limit is None and not cursor and not filters["prefix"] and can_streak is None and not min_length:
+        return await _versioned_response(request, ta_name, lambda: _streak(ta_name))
+    limit = min(max(limit or STREAK_PAGE_DEFAULT, 1), STREAK_PAGE_MAX)
+    return await _versioned_response(request, ta_name, lambda: _streak_page(ta_name, after, limit, filters))
+
+
+def _encode_cursor(name):
+    return base64.urlsafe_b64encode(name.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """The student name a pagination cursor points after ("" for the first page)."""
+    if not cursor:
+        return ""
+    try:
+        return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _streak_page(ta_name, after, limit, filters):
+    max_week = await run_db(get_max_week, ta_name)
+    if max_week == 0:
+        return {"has_data": False}
+    page = await run_db(get_streak_page, ta_name, max_week, after, limit, **filters)
+    MIN_STREAK_WEEKS = 4
+    return {
+        "has_data": True,
+        "max_week": max_week,
+        "streak": {
+            "min_weeks": MIN_STREAK_WEEKS,
+            "history": page,
+            "next_cursor": _encode_cursor(page[-1]["name"]) if len(page) == limit else None,
+        },
+    }
+
+
+async def _streak_ndjson(request, ta_name, after, filters):
+    """Stream the (filtered) history as NDJSON, one page of students at a time."""
+    encoding = choose_encoding(request.headers.get("accept-encoding"), streaming=True)
+    version = await run_db(get_data_version, ta_name)
+    etag = f'"{version}-ndjson{f"-{encoding}" if encoding else ""}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": VARY}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    max_week = await run_db(get_max_week, ta_name)
+
+    async def lines():
+        if max_week == 0:
+            return
+        pages = iter_streak_pages(ta_name, max_week, STREAK_PAGE_MAX, after, **filters)
+        while (page := await run_db(next, pages, None)) is not None:
+            yield "".join(json.dumps(s, separators=(",", ":")) + "\n" for s in page).encode()
+
+    async def gzipped():
+        compressor = gzip_stream_compressor()
+        async for chunk in lines():
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return StreamingResponse(gzipped(), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+
+async def _streak(ta_name):
+    max_week = await run_db(get_max_week, ta_name)
     if max_week == 0:
         return {"has_data": False}
 
-    history = get_streak_history(ta_name, max_week)
+    history = await run_db(get_streak_history, ta_name, max_week)
 
     MIN_STREAK_WEEKS = 4
     rewarded = []
@@ -135,57 +348,117 @@ async def streak(ta_name: str):
     }
 
 
+def _select_engine(total_bytes):
+    """Pick the reward engine for a week whose gradesheets total total_bytes."""
+    if REWARDS_ENGINE == "columnar" or (
+        REWARDS_ENGINE == "auto"
+        and columnar_available()
+        and total_bytes >= COLUMNAR_MIN_BYTES
+    ):
+        return compute_week_rewards_columnar
+    return compute_week_rewards
+
+
+def _class_start_time(ta_name):
+    """Class start time from the DB user first, then the config fallback."""
+    db_user = get_user_by_crn(ta_name)
+    if db_user:
+        return db_user.get("class_start_time", "02:30:00 PM")
+    crn_num = int(ta_name) if ta_name.isdigit() else 0
+    return ALLOWED_CRNS.get(crn_num, {}).get("class_start_time", "02:30:00 PM")
+
+
+def _parse_rewards_json(rewards_json):
+    if not rewards_json:
+        return None
+    try:
+        return json.loads(rewards_json)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid rewards JSON")
+
+
+def _open_gradesheet(upload: UploadFile):
+    """Return a text stream over an uploaded CSV that decodes it chunk by chunk.
+
+    The upload stays in Starlette's spooled temp file; nothing is read into
+    memory here. Oversized files are rejected before parsing starts.
+    """
+    size = upload.size
+    if size is None:
+        size = upload.file.seek(0, io.SEEK_END)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{upload.filename} exceeds the {MAX_UPLOAD_BYTES}-byte upload limit",
+        )
+    upload.file.seek(0)
+    return io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+
+
+def _read_sheets(sheets):
+    return [s.buffer.read() for s in sheets]
+
+
 @app.post("/api/compute")
 async def compute(
-    problem1: UploadFile = File(...),
-    problem2: UploadFile = File(...),
+    request: Request,
     week: int = Form(...),
     ta_name: str = Form(...),
     rewards_json: str = Form(""),
+    problem1: UploadFile | None = File(None),
+    problem2: UploadFile | None = File(None),
+    problems: list[UploadFile] = File([]),
+    include_history: bool = Form(True),
 ):
+    """Compute a week's rewards.
+
+    Gradesheets are taken in order from problem1, problem2 and then any
+    number of repeated `problems` fields, so weeks with 3-5 problems can be
+    uploaded in one request. With include_history=false the streak history
+    is left out of the response (page through /api/streak instead);
+    ?format=compact returns the compact format (see wire.py).
+    """
     if week < 1:
         raise HTTPException(status_code=400, detail="Week must be at least 1")
 
-    custom_rewards = None
-    if rewards_json:
-        try:
-            custom_rewards = json.loads(rewards_json)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid rewards JSON")
-
-    try:
-        file1_content = (await problem1.read()).decode("utf-8")
-        file2_content = (await problem2.read()).decode("utf-8")
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="Files must be valid UTF-8 CSV files")
-
-    # Get class start time from DB user first, then config fallback
-    db_user = get_user_by_crn(ta_name)
-    if db_user:
-        class_start = db_user.get("class_start_time", "02:30:00 PM")
-    else:
-        crn_num = int(ta_name) if ta_name.isdigit() else 0
-        class_start = ALLOWED_CRNS.get(crn_num, {}).get("class_start_time", "02:30:00 PM")
-
-    try:
-        result = compute_rewards(file1_content, file2_content, week, custom_rewards, class_start)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing CSV files: {e}")
-
-    # Save results to SQLite
-    save_week_results(ta_name, week, result["students_data"])
-    save_week_meta(ta_name, week, result["week_range"], result["reward_points"],
-                   result["early_submission"]["total_eligible"])
-    save_early_submissions(ta_name, week, result["early_submission"]["top5"])
-
-    # Build full streak history (includes current week just saved)
-    streak_history = get_streak_history(ta_name, week)
+    uploads = [u for u in (problem1, problem2) if u is not None] + problems
+    if not uploads:
+        raise HTTPException(status_code=400, detail="At least one problem gradesheet is required")
+    if len(uploads) > MAX_PROBLEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PROBLEMS} problems per week")
+
+    custom_rewards = _parse_rewards_json(rewards_json)
+    sheets = [_open_gradesheet(u) for u in uploads]
+    if cpu_uses_processes():
+        # Worker processes get the raw bytes; streams cannot be pickled
+        sheets = await run_db(_read_sheets, sheets)
+    files = [(u.filename, s) for u, s in zip(uploads, sheets)]
+    class_start = await run_db(_class_start_time, ta_name)
+
+    engine = _select_engine(sum(u.size or 0 for u in uploads))
+    job = (week, files, engine, custom_rewards, class_start, MAX_UPLOAD_ROWS)
+    _, result, error = await run_cpu(compute_week, job)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    # Save results to SQLite (replaces any earlier upload of this week)
+    await run_db(save_week, ta_name, week, result["students_data"], result["week_range"], result["reward_points"],
+                 result["early_submission"]["total_eligible"], result["early_submission"]["top5"])
 
     # Streak rewards start at week 4
     MIN_STREAK_WEEKS = 4
+    if include_history:
+        # Build full streak history (includes current week just saved)
+        streak_history = await run_db(get_streak_history, ta_name, week)
+    else:
+        streak_history = None
     rewarded = []
     if week >= MIN_STREAK_WEEKS:
-        for s in streak_history:
+        if streak_history is None:
+            candidates = await run_db(get_student_streaks, ta_name, week, MIN_STREAK_WEEKS)
+        else:
+            candidates = streak_history
+        for s in candidates:
             if s["streak_length"] >= MIN_STREAK_WEEKS:
                 rewarded.append({
                     "name": s["name"],
@@ -198,41 +471,208 @@ async def compute(
 
     result["streak"] = {
         "min_weeks": MIN_STREAK_WEEKS,
-        "history": streak_history,
         "rewarded": rewarded,
         "total_rewarded": len(rewarded),
     }
+    if streak_history is not None:
+        result["streak"]["history"] = streak_history
 
-    return result
+    # Already plain JSON types; skip FastAPI's per-value encoding pass, which
+    # holds the event loop for large cohorts
+    return await _encoded_response(request, result)
+
+
+@app.post("/api/import")
+async def bulk_import(
+    ta_name: str = Form(...),
+    archive: UploadFile = File(...),
+    rewards_json: str = Form(""),
+):
+    """Import many weeks at once from a zip of gradesheet CSVs.
+
+    Weeks are computed in parallel and saved in one transaction; weeks that
+    fail are reported and skipped, the rest are imported.
+    """
+    custom_rewards = _parse_rewards_json(rewards_json)
+    size = archive.size if archive.size is not None else archive.file.seek(0, io.SEEK_END)
+    if size > MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail=f"{archive.filename} exceeds the {MAX_IMPORT_BYTES}-byte import limit")
+    archive.file.seek(0)
+    try:
+        weeks, week_errors, skipped = await run_db(read_archive, archive.file, MAX_UPLOAD_BYTES, MAX_IMPORT_BYTES)
+    except GradesheetError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+    if not weeks and not week_errors:
+        raise HTTPException(status_code=400, detail="No week gradesheets found in the archive")
+
+    class_start = await run_db(_class_start_time, ta_name)
+    errors = [{"week": week, "error": error} for week, error in week_errors.items()]
+    jobs = []
+    for week, files in sorted(weeks.items()):
+        if len(files) > MAX_PROBLEMS:
+            errors.append({"week": week, "error": f"At most {MAX_PROBLEMS} problems per week"})
+            continue
+        engine = _select_engine(sum(len(data) for _, data in files))
+        jobs.append((week, files, engine, custom_rewards, class_start, MAX_UPLOAD_ROWS))
+
+    imported = []
+    to_save = []
+    computed = await asyncio.gather(*(run_cpu(compute_week, job) for job in jobs))
+    for week, result, error in computed:
+        if error:
+            errors.append({"week": week, "error": error})
+            continue
+        to_save.append({
+            "week": week,
+            "students_data": result["students_data"],
+            "week_range": result["week_range"],
+            "reward_points": result["reward_points"],
+            "total_eligible": result["early_submission"]["total_eligible"],
+            "top5": result["early_submission"]["top5"],
+        })
+        imported.append({
+            "week": week,
+            "problem_count": result["problem_count"],
+            "students": len(result["students_data"]),
+            "total_passed": result["both_completion"]["total_passed"],
+            "total_eligible": result["early_submission"]["total_eligible"],
+        })
+    await run_db(save_weeks, ta_name, to_save)
+
+    return {
+        "imported": imported,
+        "errors": sorted(errors, key=lambda e: e["week"]),
+        "skipped": skipped,
+    }
 
 
 @app.get("/api/weeks/{ta_name}")
-async def weeks_with_data(ta_name: str):
+async def weeks_with_data(request: Request, ta_name: str):
     """Return which weeks have stored data for this TA."""
-    weeks = get_weeks_with_data(ta_name)
-    return {"weeks": weeks}
+    async def build():
+        return {"weeks": await run_db(get_weeks_with_data, ta_name)}
+    return await _versioned_response(request, ta_name, build)
+
+
+@app.get("/api/streak-stats/{ta_name}")
+async def streak_stats_endpoint(
+    request: Request, ta_name: str, up_to_week: int | None = None, window: int = 4, min_in_window: int = 0,
+):
+    """Streak measures for every student, from the stored week bitmasks.
+
+    For weeks 1..up_to_week (default: the latest week): streak_length from
+    week 1, longest_run anywhere, current_run ending at up_to_week and
+    perfect_in_window over the last `window` weeks. min_in_window keeps only
+    students perfect in at least that many of those weeks.
+    """
+    if window < 1:
+        raise HTTPException(status_code=400, detail="window must be at least 1")
+
+    async def build():
+        max_week = await run_db(get_max_week, ta_name)
+        if max_week == 0:
+            return {"has_data": False}
+        week = max(1, min(up_to_week or max_week, max_week, MASK_WEEKS))
+        students = []
+        for name, perfect_mask, present_mask in await run_db(get_week_masks, ta_name, week):
+            stats = streak_stats(perfect_mask, week, window)
+            if stats["perfect_in_window"] >= min_in_window:
+                stats["present_in_window"] = count_in_window(present_mask, week, window)
+                students.append({"name": name, **stats})
+        return {"has_data": True, "up_to_week": week, "window": window, "students": students}
+
+    return await _versioned_response(request, ta_name, build)
+
+
+def _load_analytics(ta_name, sections):
+    """(week_stats rows, section_stats rows) in one round trip."""
+    return get_week_stats(ta_name), get_section_stats(sections)
+
+
+@app.get("/api/analytics/{ta_name}")
+async def analytics(request: Request, ta_name: str):
+    """Term analytics for a TA next to the other sections in config.json.
+
+    Read from the week_stats and section_stats rollups, which every write
+    keeps current, so the cost does not grow with the number of students.
+    """
+    sections = [ta_name] + [str(crn) for crn in ALLOWED_CRNS if str(crn) != ta_name]
+    weeks, section_rows = await run_db(_load_analytics, ta_name, sections)
+    summaries = [section_summary(row) for row in section_rows]
+    own = next((s for s in summaries if s["ta_name"] == ta_name), None)
+    return await _encoded_response(request, {
+        "has_data": own is not None,
+        "section": own,
+        "weeks": [week_summary(row) for row in weeks],
+        "sections": summaries,
+    })
+
+
+@app.get("/api/export/{ta_name}")
+async def export_report(ta_name: str, format: str = "csv"):
+    """Stream the full-term report as CSV or XLSX.
+
+    One row per student per stored week: grades, early-submission rank and
+    time, streak as of that week, reward points and bits sent. Rows are read
+    and encoded one chunk at a time on the DB pool, so memory does not grow
+    with the term.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_MEDIA_TYPES)}")
+    problem_count = await run_db(get_report_problem_count, ta_name)
+    columns = report_columns(problem_count)
+    rows = report_rows(iter_report_chunks(ta_name, EXPORT_CHUNK_ROWS), problem_count)
+    stream = xlsx_stream(columns, rows) if format == "xlsx" else csv_stream(columns, rows)
+
+    async def body():
+        while (piece := await run_db(next, stream, None)) is not None:
+            yield piece
+
+    filename = f"RewardKeeper_{re.sub(r'[^A-Za-z0-9_.-]', '_', ta_name)}_Term_Report.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/api/students/{ta_name}")
+async def students(request: Request, ta_name: str, prefix: str = "", limit: int | None = None):
+    """Students seen in any saved week, optionally filtered by name prefix."""
+    async def build():
+        return {"students": await run_db(get_student_roster, ta_name, prefix.strip(), limit)}
+    return await _versioned_response(request, ta_name, build)
+
+
+def _load_week(ta_name, week):
+    """(rows, meta, early submissions) of a stored week in one round trip."""
+    rows = get_week_results(ta_name, week)
+    if not rows:
+        return rows, None, []
+    return rows, get_week_meta(ta_name, week), get_early_submissions(ta_name, week)
 
 
 @app.get("/api/week-data/{ta_name}/{week}")
-async def week_data(ta_name: str, week: int):
+async def week_data(request: Request, ta_name: str, week: int):
     """Return stored results for a specific week."""
-    rows = get_week_results(ta_name, week)
+    return await _versioned_response(request, ta_name, lambda: _week_data(ta_name, week))
+
+
+async def _week_data(ta_name, week):
+    rows, meta, early = await run_db(_load_week, ta_name, week)
     if not rows:
         return {"has_data": False}
 
     full_mark = rows[0]["full_mark"] if rows else 0
     passed = [r["student_name"] for r in rows if r["both_perfect"]]
-    not_passed = [
-        {
-            "name": r["student_name"],
-            "problem1": f"{r['problem1_grade']}/{full_mark}",
-            "problem2": f"{r['problem2_grade']}/{full_mark}",
-        }
-        for r in rows if not r["both_perfect"]
-    ]
+    not_passed = []
+    for r in rows:
+        if not r["both_perfect"]:
+            entry = {"name": r["student_name"]}
+            for i, grade in enumerate(r["grades"], 1):
+                entry[f"problem{i}"] = f"{grade}/{full_mark}"
+            not_passed.append(entry)
 
-    meta = get_week_meta(ta_name, week)
-    early = get_early_submissions(ta_name, week)
     top5 = [
         {
             "rank": e["rank"],
@@ -248,6 +688,7 @@ async def week_data(ta_name: str, week: int):
         "has_data": True,
         "dungeon_week": week,
         "full_mark": full_mark,
+        "problem_count": len(rows[0]["grades"]),
         "both_completion": {
             "passed": passed,
             "not_passed": not_passed,
@@ -270,16 +711,28 @@ async def week_data(ta_name: str, week: int):
 @app.post("/api/delete-week")
 async def delete_week(ta_name: str = Form(...), week: int = Form(...)):
     """Delete data for a single week."""
-    delete_week_data(ta_name, week)
+    await run_db(delete_week_data, ta_name, week)
     return {"status": "ok", "message": f"Week {week} data for {ta_name} has been deleted."}
 
 
 @app.post("/api/reset")
 async def reset(ta_name: str = Form(...)):
-    reset_db(ta_name)
+    await run_db(reset_db, ta_name)
     return {"status": "ok", "message": f"All saved week data for {ta_name} has been cleared."}
 
 
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    """Hit/miss counters of the in-process read caches."""
+    return cache_stats()
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Request, DB and Prizeversity metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # --- Prizeversity Endpoints ---
 
 class PvSettingsBody(BaseModel):
@@ -301,6 +754,14 @@ class SaveMappingsBody(BaseModel):
 
 class SyncStudentsBody(BaseModel):
     ta_name: str
+    # Roster the client already holds; when given, only changes are returned
+    classroom_id: str | None = None
+    roster_version: int | None = None
+    refresh: bool = False
+
+
+class InvalidateRosterBody(BaseModel):
+    ta_name: str
 
 
 class SendRewardsBody(BaseModel):
@@ -319,14 +780,14 @@ async def pv_save_settings(body: PvSettingsBody):
         classroom = await client.get_classroom()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to connect to Prizeversity: {e}")
-    save_pv_settings(body.ta_name, api_key, classroom_id)
+    await run_db(save_pv_settings, body.ta_name, api_key, classroom_id)
     return {"status": "ok", "classroom": classroom}
 
 
 @app.get("/api/prizeversity/settings/{ta_name}")
 async def pv_get_settings(ta_name: str):
     """Check if Prizeversity is configured. Never returns the api_key."""
-    settings = get_pv_settings(ta_name)
+    settings = await run_db(get_pv_settings, ta_name)
     if not settings:
         return {"configured": False}
     return {
@@ -336,34 +797,59 @@ async def pv_get_settings(ta_name: str):
     }
 
 
+async def _refresh_roster(client, refresh=False):
+    """Bring the cached roster of client's classroom up to date if it is stale.
+
+    Returns the roster version, or None when nothing is cached and
+    Prizeversity is unreachable. A failed refresh serves the stale copy.
+    """
+    classroom_id = client.classroom_id
+    meta = await run_db(get_roster_meta, classroom_id)
+    now = time.time()
+    if meta and not refresh and now - meta["fetched_at"] < PV_ROSTER_TTL:
+        return meta["version"]
+    try:
+        students, etag = await client.list_students_conditional(meta["etag"] if meta else "")
+    except Exception:
+        return meta["version"] if meta else None
+    if students is None:
+        await run_db(touch_roster, classroom_id, now)
+        return meta["version"]
+    return await run_db(save_roster, classroom_id, students, etag, now)
+
+
+async def _match_local(pv_students, rk_names):
+    """Local fuzzy matching on the CPU pool.
+
+    Cohorts of MATCH_SPLIT_MIN_NAMES or more are shortlisted as MATCH_JOBS
+    separate jobs; the assignment then runs once over all shortlists.
+    """
+    jobs = MATCH_JOBS if len(rk_names) >= MATCH_SPLIT_MIN_NAMES else 1
+    size = max(1, -(-len(rk_names) // max(jobs, 1)))
+    parts = await asyncio.gather(*(
+        run_cpu(shortlist_names, pv_students, rk_names[i:i + size]) for i in range(0, len(rk_names), size)
+    ))
+    shortlists = [s for part in parts for s in part]
+    return await run_cpu(assign_matches, pv_students, rk_names, shortlists)
+
+
 @app.post("/api/prizeversity/sync-students")
 async def pv_sync_students(body: SyncStudentsBody):
     """Fetch PV students and auto-match against RK student names."""
-    settings = get_pv_settings(body.ta_name)
+    settings = await run_db(get_pv_settings, body.ta_name)
     if not settings:
         raise HTTPException(status_code=400, detail="Prizeversity not configured")
 
     client = PrizeversityClient(settings["classroom_id"], settings["api_key"])
 
-    # Get all unique RK student names from week_results
-    max_week = get_max_week(body.ta_name)
-    rk_names = set()
-    for w in range(1, max_week + 1):
-        for row in get_week_results(body.ta_name, w):
-            rk_names.add(row["student_name"])
-    rk_names = sorted(rk_names)
+    # All RK student names seen in any week
+    rk_names = [s["student_name"] for s in await run_db(get_student_roster, body.ta_name)]
 
-    # Fetch PV student list (for dropdown in unmatched cases)
+    # PV student list (for dropdown in unmatched cases), served from the roster cache
+    roster_version = await _refresh_roster(client, body.refresh)
     pv_students = []
-    try:
-        pv_result = await client.list_students()
-        pv_students = pv_result.get("users", pv_result.get("students", []))
-        # Normalize: ensure each student has a "studentId" field
-        for s in pv_students:
-            if "studentId" not in s and "userId" in s:
-                s["studentId"] = s["userId"]
-    except Exception:
-        pass
+    if roster_version is not None:
+        pv_students, _ = await run_db(get_roster_students, client.classroom_id)
 
     # Try PV's /users/match API first, fall back to local fuzzy matching
     matched = []
@@ -383,60 +869,86 @@ async def pv_sync_students(body: SyncStudentsBody):
     except Exception:
         # Fallback: use local fuzzy matching against the student list
         if pv_students:
-            matched, unmatched = client.match_students_local(pv_students, rk_names)
+            matched, unmatched = await _match_local(pv_students, rk_names)
         else:
             # Still return RK names as unmatched so the UI can show them
             unmatched = list(rk_names)
 
     # Also return existing saved mappings so the frontend can merge
-    saved = get_student_mappings(body.ta_name)
+    saved = await run_db(get_student_mappings, body.ta_name)
 
-    return {
-        "pv_students": pv_students,
+    result = {
+        "classroom_id": client.classroom_id,
+        "roster_version": roster_version,
         "matched": matched,
         "unmatched": unmatched,
         "saved_mappings": saved,
     }
+    # A client version from before this roster was first cached (e.g. of a
+    # recreated database) gets the full roster rather than a delta
+    meta = None
+    if roster_version is not None and body.roster_version is not None and body.classroom_id == client.classroom_id:
+        meta = await run_db(get_roster_meta, client.classroom_id)
+    if meta and meta["base_version"] <= body.roster_version <= roster_version:
+        changed, removed = await run_db(get_roster_students, client.classroom_id, since_version=body.roster_version)
+        result["pv_students_delta"] = {"changed": changed, "removed": removed}
+    else:
+        result["pv_students"] = pv_students
+    return result
+
+
+@app.post("/api/prizeversity/roster/invalidate")
+async def pv_invalidate_roster(body: InvalidateRosterBody):
+    """Drop the cached roster's freshness so the next sync refetches it."""
+    settings = await run_db(get_pv_settings, body.ta_name)
+    if not settings:
+        raise HTTPException(status_code=400, detail="Prizeversity not configured")
+    await run_db(invalidate_roster, settings["classroom_id"])
+    return {"status": "ok"}
 
 
 @app.post("/api/prizeversity/save-mappings")
 async def pv_save_mappings(body: SaveMappingsBody):
     """Save manual student mappings."""
     mappings = [m.model_dump() for m in body.mappings]
-    save_student_mappings(body.ta_name, mappings)
+    await run_db(save_student_mappings, body.ta_name, mappings)
     return {"status": "ok", "count": len(mappings)}
 
 
 @app.get("/api/prizeversity/mappings/{ta_name}")
 async def pv_get_mappings(ta_name: str):
     """Get saved student mappings."""
-    mappings = get_student_mappings(ta_name)
+    mappings = await run_db(get_student_mappings, ta_name)
     return {"mappings": mappings}
 
 
 @app.post("/api/prizeversity/send-rewards")
 async def pv_send_rewards(body: SendRewardsBody):
-    """DRY RUN: Aggregate points per student, resolve mappings, return preview.
-    Does NOT call wallet/adjust."""
-    settings = get_pv_settings(body.ta_name)
+    """Aggregate points per student and resolve mappings.
+
+    With dry_run, only return the preview. Otherwise send the bits through
+    wallet/adjust in chunks; students already credited for the week are skipped.
+    """
+    settings = await run_db(get_pv_settings, body.ta_name)
     if not settings:
         raise HTTPException(status_code=400, detail="Prizeversity not configured")
 
     # Get week results and meta
-    week_results = get_week_results(body.ta_name, body.week)
+    week_results, meta, early = await run_db(_load_week, body.ta_name, body.week)
     if not week_results:
         raise HTTPException(status_code=400, detail=f"No data for week {body.week}")
 
-    meta = get_week_meta(body.ta_name, body.week)
     reward_points = meta["reward_points"] if meta else 0
 
     # Get early submissions
-    early = get_early_submissions(body.ta_name, body.week)
     early_names = {e["student_name"] for e in early}
 
-    # Get streak data
-    streak_history = get_streak_history(body.ta_name, body.week)
+    # Get streak data (only students who reached the minimum streak)
     MIN_STREAK_WEEKS = 4
+    streak_lengths = {
+        s["name"]: s["streak_length"]
+        for s in await run_db(get_student_streaks, body.ta_name, body.week, MIN_STREAK_WEEKS)
+    }
 
     # Aggregate points per student
     student_points = {}
@@ -456,19 +968,17 @@ async def pv_send_rewards(body: SendRewardsBody):
             reasons.append(f"Early Submission: {reward_points}")
 
         # Streak reward
-        if body.week >= MIN_STREAK_WEEKS:
-            for s in streak_history:
-                if s["name"] == name and s["streak_length"] >= MIN_STREAK_WEEKS:
-                    streak_pts = reward_points * s["streak_length"]
-                    pts += streak_pts
-                    reasons.append(f"Streak ({s['streak_length']} weeks): {streak_pts}")
-                    break
+        if name in streak_lengths:
+            streak_length = streak_lengths[name]
+            streak_pts = reward_points * streak_length
+            pts += streak_pts
+            reasons.append(f"Streak ({streak_length} weeks): {streak_pts}")
 
         if pts > 0:
             student_points[name] = {"points": pts, "reasons": reasons}
 
     # Resolve mappings
-    mappings = get_student_mappings(body.ta_name)
+    mappings = await run_db(get_student_mappings, body.ta_name)
     mapping_lookup = {m["rk_name"]: m for m in mappings}
 
     preview = []
@@ -495,7 +1005,8 @@ async def pv_send_rewards(body: SendRewardsBody):
 
     # If dry_run, just return preview; if not, actually send bits
     if body.dry_run:
-        save_reward_send_log(
+        await run_db(
+            save_reward_send_log,
             body.ta_name, body.week, datetime.now().isoformat(),
             len(preview), total_bits,
             f"Week {body.week} rewards (preview)",
@@ -515,38 +1026,73 @@ async def pv_send_rewards(body: SendRewardsBody):
     if not preview:
         raise HTTPException(status_code=400, detail="No mapped students to send rewards to")
 
+    # Students credited by an earlier (partial) send of this week are skipped.
+    # Every other student recorded by an earlier send is resent in the chunk
+    # it was first sent in, with the same amount and Idempotency-Key: that
+    # chunk may have been applied by Prizeversity even though we saw it fail.
+    recorded = await run_db(get_reward_send_items, body.ta_name, body.week)
+    already_sent = {i["pv_student_id"] for i in recorded if i["status"] == "sent"}
+    resend = [i for i in recorded if i["status"] != "sent" and i["chunk_key"]]
+    recorded_ids = already_sent | {i["pv_student_id"] for i in resend}
+    items = assign_wallet_chunks([
+        {
+            "pv_student_id": p["pv_student_id"],
+            "rk_name": p["rk_name"],
+            "amount": p["points"],
+            "idempotency_key": wallet_idempotency_key(body.ta_name, body.week, p["pv_student_id"]),
+        }
+        for p in preview if p["pv_student_id"] not in recorded_ids
+    ])
+    await run_db(save_reward_send_items, body.ta_name, body.week, items)
+
     client = PrizeversityClient(settings["classroom_id"], settings["api_key"])
-    updates = [{"userId": p["pv_student_id"], "amount": p["points"]} for p in preview]
+    wallet_chunks = {}
+    for i in resend + items:
+        wallet_chunks.setdefault(i["chunk_key"], []).append(
+            {"userId": i["pv_student_id"], "amount": i["amount"], "idempotencyKey": i["idempotency_key"]}
+        )
     description = f"RewardKeeper Week {body.week} rewards"
 
-    try:
-        api_result = await client.adjust_wallet(updates, description)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to send rewards: {e}")
+    chunks = await client.adjust_wallet_batched(list(wallet_chunks.items()), description)
+    for chunk in chunks:
+        await run_db(update_reward_send_items, body.ta_name, body.week, chunk["user_ids"], chunk["status"], chunk["error"])
+
+    failed = [c for c in chunks if c["status"] != "sent"]
+    if failed and len(failed) == len(chunks):
+        raise HTTPException(status_code=400, detail=f"Failed to send rewards: {failed[0]['error']}")
 
-    save_reward_send_log(
+    sent_items = [i for i in await run_db(get_reward_send_items, body.ta_name, body.week) if i["status"] == "sent"]
+    status = "partial" if failed else "sent"
+    await run_db(
+        save_reward_send_log,
         body.ta_name, body.week, datetime.now().isoformat(),
-        len(preview), total_bits,
+        len(sent_items), sum(i["amount"] for i in sent_items),
         description,
-        status="sent",
+        status=status,
     )
 
     return {
         "dry_run": False,
+        "status": status,
         "week": body.week,
         "reward_points": reward_points,
         "preview": preview,
         "unmapped": unmapped,
         "total_students": len(preview),
         "total_bits": total_bits,
-        "api_result": api_result,
+        "already_sent": len(already_sent),
+        "chunks": [
+            {k: c[k] for k in ("index", "status", "user_ids", "attempts", "error")}
+            for c in chunks
+        ],
+        "api_result": [c["result"] for c in chunks if c["status"] == "sent"],
     }
 
 
 @app.get("/api/prizeversity/send-status/{ta_name}/{week}")
 async def pv_send_status(ta_name: str, week: int):
     """Check if rewards were 'sent' for a week."""
-    log = get_reward_send_log(ta_name, week)
+    log = await run_db(get_reward_send_log, ta_name, week)
     if not log:
         return {"sent": False}
     return {
@@ -0,0 +1,229 @@
+"""Fuzzy matching of RewardKeeper student names to a Prizeversity roster.
+
+A NameIndex is built once per roster. Each PV name is normalized and split
+into per-token trigrams, and an inverted index maps trigram -> students.
+Matching an RK name counts trigram overlaps to shortlist a few candidates,
+and only those are scored exactly with SequenceMatcher (including the
+first/last swapped form), so a roster no longer costs n * m ratio
+computations.
+
+Two assignment strategies are supported: "greedy" (RK names in order take
+their best free candidate, as the original scan did) and "optimal"
+(maximum total score, solved per connected component with the Hungarian
+algorithm). Shortlisting is independent per RK name, so callers can split
+a large cohort with shortlist_names across the shared CPU pool and then
+run assign_matches once (see main._match_local).
+"""
+
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+MATCH_THRESHOLD = 0.75
+
+# Candidates scored exactly per RK name, after trigram blocking
+SHORTLIST_SIZE = int(os.getenv("PV_MATCH_SHORTLIST", "25"))
+MATCH_STRATEGY = os.getenv("PV_MATCH_STRATEGY", "greedy")
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name):
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(_NON_ALNUM.split(text)).strip()
+
+
+def name_trigrams(name):
+    """Trigrams of each padded token; independent of token order."""
+    grams = set()
+    for token in normalize_name(name).split():
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """Trigram index over one Prizeversity roster."""
+
+    def __init__(self, pv_students):
+        self.students = list(pv_students)
+        self._matchers = []
+        self._postings = {}
+        for i, pv in enumerate(self.students):
+            pv_name = pv.get("name", "").lower().strip()
+            matchers = [SequenceMatcher(None, "", pv_name)]
+            parts = pv_name.split()
+            if len(parts) == 2:
+                matchers.append(SequenceMatcher(None, "", f"{parts[1]} {parts[0]}"))
+            self._matchers.append(matchers)
+            for gram in name_trigrams(pv_name):
+                self._postings.setdefault(gram, []).append(i)
+
+    def __len__(self):
+        return len(self.students)
+
+    def candidates(self, rk_name, limit=SHORTLIST_SIZE):
+        """Indexes of the PV students sharing the most trigrams with rk_name."""
+        overlap = {}
+        for gram in name_trigrams(rk_name):
+            for i in self._postings.get(gram, ()):
+                overlap[i] = overlap.get(i, 0) + 1
+        ranked = sorted(overlap, key=lambda i: (-overlap[i], i))
+        return ranked[:limit]
+
+    def score(self, rk_name, i):
+        """SequenceMatcher ratio against PV student i, best of both name orders."""
+        rk_lower = rk_name.lower().strip()
+        best = 0.0
+        for matcher in self._matchers[i]:
+            matcher.set_seq1(rk_lower)
+            best = max(best, matcher.ratio())
+        return best
+
+    def shortlist(self, rk_name, threshold=MATCH_THRESHOLD, limit=SHORTLIST_SIZE):
+        """[(score, index)] of candidates scoring >= threshold, best first."""
+        scored = [(self.score(rk_name, i), i) for i in self.candidates(rk_name, limit)]
+        return sorted(((s, i) for s, i in scored if s >= threshold), key=lambda x: (-x[0], x[1]))
+
+
+def shortlist_names(pv_students, rk_names, threshold=MATCH_THRESHOLD):
+    """Shortlist (see NameIndex.shortlist) of each RK name, in order."""
+    index = NameIndex(pv_students)
+    return [index.shortlist(name, threshold) for name in rk_names]
+
+
+# --- Assignment ---
+
+def _assign_greedy(shortlists):
+    """RK names in order take their best still-unused candidate."""
+    assignment = {}
+    used = set()
+    for r, shortlist in enumerate(shortlists):
+        for score, i in shortlist:
+            if i not in used:
+                assignment[r] = (i, score)
+                used.add(i)
+                break
+    return assignment
+
+
+def _hungarian(cost):
+    """Minimum-cost assignment of every row of an n x m matrix (n <= m).
+
+    Returns a list giving the chosen column for each row.
+    """
+    n, m = len(cost), len(cost[0])
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        p[0] = row
+        col0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col0] = True
+            i0, delta, col1 = p[col0], inf, 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, col0
+                    if minv[j] < delta:
+                        delta, col1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            col0 = col1
+            if p[col0] == 0:
+                break
+        while col0:
+            col1 = way[col0]
+            p[col0] = p[col1]
+            col0 = col1
+    result = [0] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            result[p[j] - 1] = j - 1
+    return result
+
+
+def _assign_optimal(shortlists):
+    """Maximize the total score of matched pairs.
+
+    Candidate edges split into small connected components, and each
+    component is solved exactly with the Hungarian algorithm.
+    """
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for r, shortlist in enumerate(shortlists):
+        for _, i in shortlist:
+            parent[find(("rk", r))] = find(("pv", i))
+
+    components = {}
+    for r, shortlist in enumerate(shortlists):
+        if shortlist:
+            components.setdefault(find(("rk", r)), []).append(r)
+
+    assignment = {}
+    for rows in components.values():
+        cols = sorted({i for r in rows for _, i in shortlists[r]})
+        scores = [dict((i, s) for s, i in shortlists[r]) for r in rows]
+        # Pad to n <= m; a missing edge costs 0, so it is never preferred
+        width = max(len(cols), len(rows))
+        cost = [[-row_scores.get(cols[j], 0.0) if j < len(cols) else 0.0 for j in range(width)]
+                for row_scores in scores]
+        for pos, j in enumerate(_hungarian(cost)):
+            if j < len(cols) and cols[j] in scores[pos]:
+                assignment[rows[pos]] = (cols[j], scores[pos][cols[j]])
+    return assignment
+
+
+def assign_matches(pv_students, rk_names, shortlists, strategy=None):
+    """Assign RK names to PV students from their shortlists.
+
+    Returns:
+        matched: list of {rk_name, pv_student_id, pv_name, score}
+        unmatched: list of rk_names that couldn't be matched
+    """
+    strategy = strategy or MATCH_STRATEGY
+    if strategy == "optimal":
+        assignment = _assign_optimal(shortlists)
+    else:
+        assignment = _assign_greedy(shortlists)
+
+    matched = []
+    unmatched = []
+    for r, rk_name in enumerate(rk_names):
+        if r in assignment:
+            i, score = assignment[r]
+            pv = pv_students[i]
+            matched.append({
+                "rk_name": rk_name,
+                "pv_student_id": pv.get("studentId", pv.get("_id", "")),
+                "pv_name": pv.get("name", ""),
+                "score": round(score, 2),
+            })
+        else:
+            unmatched.append(rk_name)
+    return matched, unmatched
+
+
+def match_names(pv_students, rk_names, threshold=MATCH_THRESHOLD, strategy=None):
+    """Match RK names to PV students in one call (see assign_matches)."""
+    rk_names = list(rk_names)
+    return assign_matches(pv_students, rk_names, shortlist_names(pv_students, rk_names, threshold), strategy)
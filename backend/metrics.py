@@ -0,0 +1,188 @@
+"""In-process metrics in the Prometheus text format, plus a slow-request log.
+
+Recorded:
+    rk_http_requests_total / rk_http_request_duration_seconds  per route (MetricsMiddleware)
+    rk_db_calls_total / rk_db_call_duration_seconds             per db.py helper (@db_timed)
+    rk_pv_requests_total / rk_pv_request_duration_seconds       per Prizeversity call
+
+Each request also collects a breakdown of its DB and Prizeversity time; a
+request slower than SLOW_REQUEST_MS is logged with it on the
+"rewardkeeper.slow" logger. Metrics are per process.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_log = logging.getLogger("rewardkeeper.slow")
+
+# {"db": {name: [calls, seconds]}, "pv": {...}} for the current request
+_breakdown = contextvars.ContextVar("rk_request_breakdown", default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, count in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {count}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        names = self.labels + ("le",)
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, values + (bound,))} {cumulative}")
+            labels = _format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+HTTP_REQUESTS = Counter("rk_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("rk_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+DB_CALLS = Counter("rk_db_calls_total", "db.py helper calls.", ("function", "outcome"))
+DB_LATENCY = Histogram("rk_db_call_duration_seconds", "db.py helper duration.", ("function",))
+PV_REQUESTS = Counter("rk_pv_requests_total", "Prizeversity API calls by operation and status.", ("operation", "status"))
+PV_LATENCY = Histogram("rk_pv_request_duration_seconds", "Prizeversity API call latency.", ("operation",))
+
+_REGISTRY = (HTTP_REQUESTS, HTTP_LATENCY, DB_CALLS, DB_LATENCY, PV_REQUESTS, PV_LATENCY)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _add_to_breakdown(kind, name, seconds):
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        entry = breakdown[kind].setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def db_timed(fn):
+    """Record calls and duration of a db.py helper."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_CALLS.inc(name, outcome)
+            DB_LATENCY.observe(elapsed, name)
+            _add_to_breakdown("db", name, elapsed)
+
+    return wrapper
+
+
+def record_pv_call(operation, status, seconds):
+    PV_REQUESTS.inc(operation, status)
+    PV_LATENCY.observe(seconds, operation)
+    _add_to_breakdown("pv", operation, seconds)
+
+
+def _format_breakdown(breakdown):
+    parts = []
+    for kind in ("db", "pv"):
+        calls = sorted(breakdown[kind].items(), key=lambda item: -item[1][1])
+        if calls:
+            total = sum(seconds for _, seconds in breakdown[kind].values())
+            detail = ", ".join(f"{name} x{count} {seconds * 1000:.1f}ms" for name, (count, seconds) in calls)
+            parts.append(f"{kind} {total * 1000:.1f}ms [{detail}]")
+    return "; ".join(parts) or "no db/pv calls"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+        token = _breakdown.set({"db": {}, "pv": {}})
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            breakdown = _breakdown.get()
+            _breakdown.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status))
+            HTTP_LATENCY.observe(elapsed, method, route)
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                slow_log.warning(
+                    "slow request: %s %s -> %s in %.1fms (%s)",
+                    method, scope["path"], status, elapsed * 1000, _format_breakdown(breakdown),
+                )
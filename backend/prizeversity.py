@@ -1,8 +1,146 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
 import httpx
-from difflib import SequenceMatcher
 
+from matching import match_names
+from metrics import record_pv_call
 
-BASE_URL = "https://www.prizeversity.com/api/integrations"
+
+# Point at a stand-in (e.g. loadtest/mock_pv.py) with PRIZEVERSITY_BASE_URL
+BASE_URL = os.getenv("PRIZEVERSITY_BASE_URL", "https://www.prizeversity.com/api/integrations").rstrip("/")
+
+# Connection pool shared by every PrizeversityClient (overridable via environment)
+PV_MAX_CONNECTIONS = int(os.getenv("PV_MAX_CONNECTIONS", "20"))
+PV_MAX_KEEPALIVE = int(os.getenv("PV_MAX_KEEPALIVE", "10"))
+PV_KEEPALIVE_EXPIRY = float(os.getenv("PV_KEEPALIVE_EXPIRY", "30"))
+PV_HTTP2 = os.getenv("PV_HTTP2", "").lower() in ("1", "true", "yes")
+
+# Per-operation timeouts in seconds
+PV_TIMEOUT = float(os.getenv("PV_TIMEOUT", "15"))
+PV_WALLET_TIMEOUT = float(os.getenv("PV_WALLET_TIMEOUT", "30"))
+
+# Wallet adjustments are sent in chunks, a few at a time, with retries
+PV_WALLET_CHUNK_SIZE = int(os.getenv("PV_WALLET_CHUNK_SIZE", "50"))
+PV_WALLET_CONCURRENCY = int(os.getenv("PV_WALLET_CONCURRENCY", "4"))
+PV_WALLET_RETRIES = int(os.getenv("PV_WALLET_RETRIES", "3"))
+PV_RETRY_BASE_DELAY = float(os.getenv("PV_RETRY_BASE_DELAY", "0.5"))
+
+_http_client = None
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_BASE_PATH = httpx.URL(BASE_URL).path.rstrip("/")
+
+
+def _operation(path):
+    """Metric label for an API path: "classroom", "users/list", "wallet/adjust", ..."""
+    parts = path.removeprefix(_BASE_PATH).strip("/").split("/")
+    return "/".join(parts[:1] if parts[0] == "classroom" else parts[:2])
+
+
+class _TimedTransport(httpx.AsyncBaseTransport):
+    """Records the latency and status of every Prizeversity call (see metrics.py)."""
+
+    def __init__(self, transport):
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            record_pv_call(_operation(request.url.path), status, time.perf_counter() - start)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def get_http_client():
+    """Return the shared AsyncClient, creating it on first use.
+
+    The app opens it in its lifespan; lazy creation covers scripts and tools
+    that use PrizeversityClient outside the app.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=PV_MAX_CONNECTIONS,
+                max_keepalive_connections=PV_MAX_KEEPALIVE,
+                keepalive_expiry=PV_KEEPALIVE_EXPIRY,
+            ),
+            http2=PV_HTTP2 and _http2_available(),
+        )
+        _http_client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            transport=_TimedTransport(transport),
+            timeout=PV_TIMEOUT,
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared AsyncClient and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def normalize_students(pv_students):
+    """Ensure each PV student has a "studentId" field (from userId or _id)."""
+    for s in pv_students:
+        if not s.get("studentId"):
+            student_id = s.get("userId") or s.get("_id")
+            if student_id:
+                s["studentId"] = student_id
+    return pv_students
+
+
+def wallet_idempotency_key(ta_name, week, student_id):
+    """Stable key for one student's reward in one week; retries reuse it."""
+    raw = f"rewardkeeper:{ta_name}:{week}:{student_id}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def assign_wallet_chunks(items, chunk_size=None):
+    """Split send items into chunks, setting each item's chunk_key.
+
+    items: dicts with an idempotency_key (see wallet_idempotency_key). The
+    chunk key depends only on its members' keys, i.e. on TA, week and
+    students, and is stored with the items so a retry can rebuild the chunk.
+    """
+    chunk_size = chunk_size or PV_WALLET_CHUNK_SIZE
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        keys = "".join(sorted(i["idempotency_key"] for i in chunk))
+        chunk_key = hashlib.sha256(keys.encode()).hexdigest()[:32]
+        for item in chunk:
+            item["chunk_key"] = chunk_key
+    return items
+
+
+def _is_transient(exc):
+    """Network errors, timeouts, 429 and 5xx are worth retrying."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return False
 
 
 class PrizeversityClient:
@@ -13,6 +151,9 @@ class PrizeversityClient:
     In dry-run mode, only get_classroom, list_students, and match_students are used.
     adjust_wallet exists but is NOT called — the send-rewards endpoint
     returns a preview without actually sending bits.
+
+    All instances share one pooled AsyncClient (see get_http_client), so
+    repeated calls reuse kept-alive connections instead of new TLS sessions.
     """
 
     def __init__(self, classroom_id, api_key=""):
@@ -26,26 +167,46 @@ class PrizeversityClient:
         """Validate credentials by fetching classroom info.
         GET /classroom/:classroomId → { _id, name, code, studentCount }
         """
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(
-                f"{BASE_URL}/classroom/{self.classroom_id}",
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            return resp.json()
+        resp = await get_http_client().get(
+            f"/classroom/{self.classroom_id}",
+            headers=self.headers,
+            timeout=PV_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return resp.json()
 
     async def list_students(self):
         """Get all students in the classroom.
         GET /users/list/CLASSROOM_ID
         → { classroomId, className, students: [{ studentId, name, email }] }
         """
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(
-                f"{BASE_URL}/users/list/{self.classroom_id}",
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            return resp.json()
+        resp = await get_http_client().get(
+            f"/users/list/{self.classroom_id}",
+            headers=self.headers,
+            timeout=PV_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def list_students_conditional(self, etag=""):
+        """list_students, revalidated with If-None-Match when an ETag is known.
+
+        Returns (students, etag); students is None when the server answered
+        304 Not Modified. Students are normalized to carry a "studentId".
+        """
+        headers = dict(self.headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        resp = await get_http_client().get(
+            f"/users/list/{self.classroom_id}",
+            headers=headers,
+            timeout=PV_TIMEOUT,
+        )
+        if resp.status_code == 304:
+            return None, etag
+        resp.raise_for_status()
+        result = resp.json()
+        return normalize_students(result.get("users", result.get("students", []))), resp.headers.get("etag", "")
 
     async def match_students_api(self, rk_names):
         """Use Prizeversity's /users/match to match RK names to PV MongoDB ObjectIds.
@@ -57,67 +218,30 @@ class PrizeversityClient:
             "classroomId": self.classroom_id,
             "students": students,
         }
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.post(
-                f"{BASE_URL}/users/match",
-                json=payload,
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            return resp.json()
+        resp = await get_http_client().post(
+            "/users/match",
+            json=payload,
+            headers=self.headers,
+            timeout=PV_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return resp.json()
 
     def match_students_local(self, pv_students, rk_names):
         """Fallback: auto-match RK names to PV students using local fuzzy matching.
 
+        Uses the trigram-indexed matcher in matching.py.
+
         Returns:
             matched: list of {rk_name, pv_student_id, pv_name, score}
             unmatched: list of rk_names that couldn't be matched
         """
-        matched = []
-        unmatched = []
-        used_pv_ids = set()
-
-        for rk_name in rk_names:
-            best_score = 0
-            best_pv = None
-            rk_lower = rk_name.lower().strip()
-
-            for pv in pv_students:
-                pv_id = pv.get("studentId", pv.get("userId", pv.get("_id", "")))
-                if pv_id in used_pv_ids:
-                    continue
-                pv_name = pv.get("name", "").lower().strip()
-                score = SequenceMatcher(None, rk_lower, pv_name).ratio()
-
-                # Also try matching with first/last name swapped
-                parts = pv_name.split()
-                if len(parts) == 2:
-                    swapped = f"{parts[1]} {parts[0]}"
-                    swap_score = SequenceMatcher(None, rk_lower, swapped).ratio()
-                    score = max(score, swap_score)
-
-                if score > best_score:
-                    best_score = score
-                    best_pv = pv
-
-            if best_pv and best_score >= 0.75:
-                pv_id = best_pv.get("studentId", best_pv.get("_id", ""))
-                matched.append({
-                    "rk_name": rk_name,
-                    "pv_student_id": pv_id,
-                    "pv_name": best_pv.get("name", ""),
-                    "score": round(best_score, 2),
-                })
-                used_pv_ids.add(pv_id)
-            else:
-                unmatched.append(rk_name)
-
-        return matched, unmatched
-
-    async def adjust_wallet(self, updates, description):
+        return match_names(pv_students, rk_names)
+
+    async def adjust_wallet(self, updates, description, idempotency_key=None):
         """Send bits to students. NOT called in dry-run mode.
         POST /wallet/adjust
-        updates: list of {userId, amount}
+        updates: list of {userId, amount} (optionally with idempotencyKey)
         """
         payload = {
             "classroomId": self.classroom_id,
@@ -126,11 +250,58 @@ class PrizeversityClient:
             "applyGroupMultipliers": True,
             "applyPersonalMultipliers": True,
         }
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post(
-                f"{BASE_URL}/wallet/adjust",
-                json=payload,
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            return resp.json()
+        headers = self.headers
+        if idempotency_key:
+            headers = {**headers, "Idempotency-Key": idempotency_key}
+        resp = await get_http_client().post(
+            "/wallet/adjust",
+            json=payload,
+            headers=headers,
+            timeout=PV_WALLET_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def adjust_wallet_batched(self, chunks, description, concurrency=None, retries=None):
+        """Send wallet updates in concurrent chunks, retrying transient failures.
+
+        chunks: list of (chunk_key, updates), see assign_wallet_chunks. Each
+        chunk is sent with chunk_key as its Idempotency-Key header. Callers
+        must resend a failed chunk with exactly the same members and key, so
+        that one Prizeversity applied but we saw fail is recognised instead
+        of credited twice. The per-update idempotencyKey is sent as well, but
+        nothing relies on Prizeversity honouring it.
+
+        Returns one report per chunk:
+            {index, status: "sent"|"failed", user_ids, attempts, result, error}
+        """
+        retries = PV_WALLET_RETRIES if retries is None else retries
+        semaphore = asyncio.Semaphore(concurrency or PV_WALLET_CONCURRENCY)
+
+        async def send(index, chunk_key, chunk):
+            report = {
+                "index": index,
+                "status": "failed",
+                "user_ids": [u["userId"] for u in chunk],
+                "attempts": 0,
+                "result": None,
+                "error": None,
+            }
+            async with semaphore:
+                for attempt in range(retries + 1):
+                    report["attempts"] = attempt + 1
+                    try:
+                        report["result"] = await self.adjust_wallet(chunk, description, chunk_key)
+                    except Exception as e:
+                        report["error"] = str(e) or type(e).__name__
+                        if attempt == retries or not _is_transient(e):
+                            break
+                        # Full-jitter exponential backoff
+                        await asyncio.sleep(random.uniform(0, PV_RETRY_BASE_DELAY * 2 ** attempt))
+                    else:
+                        report["status"] = "sent"
+                        report["error"] = None
+                        break
+            return report
+
+        return await asyncio.gather(*(send(i, key, c) for i, (key, c) in enumerate(chunks)))
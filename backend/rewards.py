@@ -1,6 +1,7 @@
 import csv
 import io
 from datetime import datetime
+from functools import lru_cache
 
 DEFAULT_GROUPS = [
     {"start": 1, "end": 4, "reward": 10},
@@ -20,18 +21,116 @@ def get_reward_for_week(week: int, groups: list[dict] | None = None) -> tuple[st
     return f"{last['start']}-{last['end']}", last["reward"]
 
 
-def parse_gradesheet(file_content: str) -> tuple[dict, int]:
+SUBMISSION_DATE_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+
+# Other LMS export layouts accepted when the fast path does not match
+FALLBACK_DATE_FORMATS = (
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y, %I:%M %p",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y, %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+)
+
+CLOCK_TIME_FORMATS = ("%I:%M:%S %p", "%I:%M %p", "%H:%M:%S", "%H:%M")
+
+
+def _is_digits(text: str, min_len: int, max_len: int) -> bool:
+    return min_len <= len(text) <= max_len and text.isascii() and text.isdigit()
+
+
+@lru_cache(maxsize=512)
+def _parse_date_prefix(date_part: str) -> tuple[int, int, int]:
+    # A sheet spans a handful of days, so this is nearly always a cache hit
+    month, day, year = date_part.split("/")
+    if not (_is_digits(month, 1, 2) and _is_digits(day, 1, 2) and _is_digits(year, 4, 4)):
+        raise ValueError(f"not an M/D/YYYY date: {date_part!r}")
+    return int(year), int(month), int(day)
+
+
+def _twelve_hour(hour: int, meridiem: str) -> int:
+    if not 1 <= hour <= 12:
+        raise ValueError(f"hour {hour} out of range")
+    meridiem = meridiem.upper()
+    if meridiem == "AM":
+        return hour % 12
+    if meridiem == "PM":
+        return hour % 12 + 12
+    raise ValueError(f"unknown meridiem {meridiem!r}")
+
+
+def parse_submission_date(value: str) -> datetime:
+    """Parse a "Submission Date" cell such as "1/22/2026, 2:57:12 PM".
+
+    The gradesheet layout (M/D/YYYY, H:MM:SS AM/PM) is split by hand, which
+    is several times faster than strptime; anything not exactly in that
+    shape falls back to strptime and FALLBACK_DATE_FORMATS.
+    """
+    try:
+        date_part, time_part = value.split(", ")
+        clock, meridiem = time_part.split(" ")
+        hour, minute, second = clock.split(":")
+        if not (_is_digits(hour, 1, 2) and _is_digits(minute, 2, 2) and _is_digits(second, 2, 2)):
+            raise ValueError(f"not an H:MM:SS time: {clock!r}")
+        year, month, day = _parse_date_prefix(date_part)
+        return datetime(year, month, day, _twelve_hour(int(hour), meridiem), int(minute), int(second))
+    except ValueError:
+        pass
+    for fmt in (SUBMISSION_DATE_FORMAT,) + FALLBACK_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized submission date: {value!r}")
+
+
+@lru_cache(maxsize=64)
+def parse_clock_time(value: str) -> tuple[int, int, int]:
+    """Return (hour, minute, second) for a class start time like "02:30:00 PM"."""
+    for fmt in CLOCK_TIME_FORMATS:
+        try:
+            t = datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+        return t.hour, t.minute, t.second
+    raise ValueError(f"Unrecognized class start time: {value!r}")
+
+
+# Columns parse_gradesheet reads; checked against the header before any row
+REQUIRED_COLUMNS = ("#", "Student", "Test Result", "Grade", "Submission Date")
+
+
+class GradesheetError(ValueError):
+    """Raised when an uploaded gradesheet has the wrong shape or is too large."""
+
+
+def parse_gradesheet(source, max_rows: int | None = None) -> tuple[dict, int]:
+    """Parse a gradesheet from a CSV string or a text stream.
+
+    Streams are consumed one row at a time, so only the per-student records
+    are kept in memory. The header is validated before any row is read.
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    reader = csv.DictReader(source)
+    missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or ())]
+    if missing:
+        raise GradesheetError(f"missing column(s): {', '.join(missing)}")
+
     students = {}
     max_grade = 0
-    reader = csv.DictReader(io.StringIO(file_content))
-    for row in reader:
+    for count, row in enumerate(reader, 1):
+        if max_rows is not None and count > max_rows:
+            raise GradesheetError(f"more than {max_rows} rows")
         name = row["Student"]
         test_result = row["Test Result"]
         grade = int(row["Grade"])
         max_grade = max(max_grade, grade)
-        submission_date = datetime.strptime(
-            row["Submission Date"], "%m/%d/%Y, %I:%M:%S %p"
-        )
+        submission_date = parse_submission_date(row["Submission Date"])
         students[name] = {
             "id": row["#"],
             "name": name,
@@ -42,65 +141,84 @@ def parse_gradesheet(file_content: str) -> tuple[dict, int]:
     return students, max_grade
 
 
-def compute_rewards(file1_content: str, file2_content: str, week: int, custom_groups: list[dict] | None = None, class_start_time: str = "02:30:00 PM") -> dict:
-    sub1, max_grade1 = parse_gradesheet(file1_content)
-    sub2, max_grade2 = parse_gradesheet(file2_content)
-
-    full_mark = max(max_grade1, max_grade2)
+def compute_week_rewards(sheets: list, week: int, custom_groups: list[dict] | None = None, class_start_time: str = "02:30:00 PM", max_rows: int | None = None) -> dict:
+    """Compute a week's rewards from any number of problem gradesheets.
+
+    sheets[i] is the gradesheet (CSV string or text stream) for problem i + 1.
+    Sheets are merged into one record per student, and a single pass over the
+    students then yields all-complete status, the earliest full-mark
+    submission and the per-problem grades.
+    """
+    if not sheets:
+        raise GradesheetError("at least one gradesheet is required")
+    problem_count = len(sheets)
+
+    # student name -> per-problem record, None where the student has no row
+    merged = {}
+    full_mark = 0
+    for index, sheet in enumerate(sheets):
+        parsed, max_grade = parse_gradesheet(sheet, max_rows)
+        full_mark = max(full_mark, max_grade)
+        for name, record in parsed.items():
+            records = merged.get(name)
+            if records is None:
+                records = merged[name] = [None] * problem_count
+            records[index] = record
 
     week_range, reward_points = get_reward_for_week(week, custom_groups)
 
-    all_students = set(sub1.keys()) | set(sub2.keys())
-
-    # Reward 1: Both Full Mark
-    both_passed = []
+    all_passed = []
     not_passed = []
-
-    for name in sorted(all_students):
-        grade1 = sub1.get(name, {}).get("grade", 0)
-        grade2 = sub2.get(name, {}).get("grade", 0)
-        full1 = grade1 == full_mark
-        full2 = grade2 == full_mark
-        if full1 and full2:
-            both_passed.append(name)
-        else:
-            s1 = f"{grade1}/{full_mark}" if name in sub1 else "N/A"
-            s2 = f"{grade2}/{full_mark}" if name in sub2 else "N/A"
-            not_passed.append({"name": name, "problem1": s1, "problem2": s2})
-
-    # Reward 2: Early Submission (Top 5) - earliest full-mark submission
     correct_students = []
-    for name in all_students:
-        g1 = sub1.get(name, {}).get("grade", 0)
-        g2 = sub2.get(name, {}).get("grade", 0)
-        full1 = g1 == full_mark
-        full2 = g2 == full_mark
-        if full1 or full2:
-            # Find which full-mark problem was submitted earliest
-            candidates = []
-            if full1 and name in sub1:
-                candidates.append(("Problem 1", sub1[name]["submission_date"]))
-            if full2 and name in sub2:
-                candidates.append(("Problem 2", sub2[name]["submission_date"]))
-            earliest_problem, earliest_date = min(candidates, key=lambda x: x[1])
-            correct_students.append((name, earliest_date, earliest_problem))
+    students_data = []
+    for name in sorted(merged):
+        records = merged[name]
+        grades = [r["grade"] if r else 0 for r in records]
+
+        # Reward 1: full mark on every problem
+        all_full = all(g == full_mark for g in grades)
+        if all_full:
+            all_passed.append(name)
+        else:
+            entry = {"name": name}
+            for i, r in enumerate(records, 1):
+                entry[f"problem{i}"] = f"{r['grade']}/{full_mark}" if r else "N/A"
+            not_passed.append(entry)
+
+        # Reward 2: earliest full-mark submission on any problem
+        earliest = None
+        for i, r in enumerate(records, 1):
+            if r and r["grade"] == full_mark and (earliest is None or r["submission_date"] < earliest[0]):
+                earliest = (r["submission_date"], f"Problem {i}")
+        if earliest:
+            correct_students.append((name, earliest[0], earliest[1]))
+
+        students_data.append({
+            "student_name": name,
+            "grades": grades,
+            "problem1_grade": grades[0],
+            "problem2_grade": grades[1] if problem_count > 1 else 0,
+            "full_mark": full_mark,
+            "both_perfect": all_full,
+        })
 
+    # Names are already sorted, so ties on time keep alphabetical order
     correct_students.sort(key=lambda x: x[1])
 
     # Parse class start time to calculate duration
     # class_start_time is like "02:30:00 PM"
-    start_time = datetime.strptime(class_start_time, "%I:%M:%S %p")
+    start_hour, start_minute, start_second = parse_clock_time(class_start_time)
 
     top5 = []
     for i, (name, date, problems) in enumerate(correct_students[:5], 1):
         # Build a start datetime on the same date as submission
-        start_dt = date.replace(hour=start_time.hour, minute=start_time.minute, second=start_time.second)
+        start_dt = date.replace(hour=start_hour, minute=start_minute, second=start_second)
         diff = date - start_dt
         minutes_taken = max(0, diff.total_seconds() / 60)
         top5.append({
             "rank": i,
             "name": name,
-            "submission_time": date.strftime("%m/%d/%Y, %I:%M:%S %p"),
+            "submission_time": date.strftime(SUBMISSION_DATE_FORMAT),
             "problems": problems,
             "time_taken": round(minutes_taken, 1),
         })
@@ -110,24 +228,21 @@ def compute_rewards(file1_content: str, file2_content: str, week: int, custom_gr
         "week_range": week_range,
         "reward_points": reward_points,
         "full_mark": full_mark,
+        "problem_count": problem_count,
         "both_completion": {
-            "passed": both_passed,
+            "passed": all_passed,
             "not_passed": not_passed,
-            "total_passed": len(both_passed),
+            "total_passed": len(all_passed),
             "total_not_passed": len(not_passed),
         },
         "early_submission": {
             "top5": top5,
             "total_eligible": len(correct_students),
         },
-        "students_data": [
-            {
-                "student_name": name,
-                "problem1_grade": sub1.get(name, {}).get("grade", 0),
-                "problem2_grade": sub2.get(name, {}).get("grade", 0),
-                "full_mark": full_mark,
-                "both_perfect": name in both_passed,
-            }
-            for name in sorted(all_students)
-        ],
+        "students_data": students_data,
     }
+
+
+def compute_rewards(file1_content, file2_content, week: int, custom_groups: list[dict] | None = None, class_start_time: str = "02:30:00 PM", max_rows: int | None = None) -> dict:
+    """Two-problem form of compute_week_rewards, kept for existing callers."""
+    return compute_week_rewards([file1_content, file2_content], week, custom_groups, class_start_time, max_rows)
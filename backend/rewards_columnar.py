@@ -0,0 +1,197 @@
+"""Columnar reward engine for large cohorts (combined sections, MOOCs).
+
+Gradesheets are parsed straight into arrays (interned student ids, grades and
+submission times in seconds) and the reward rules run as NumPy operations.
+The result is identical to rewards.compute_week_rewards; only the work per
+row changes. Requires numpy, which is an optional dependency:
+
+    pip install numpy
+"""
+
+import csv
+import io
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from rewards import (
+    REQUIRED_COLUMNS, SUBMISSION_DATE_FORMAT, GradesheetError,
+    get_reward_for_week, parse_clock_time, parse_submission_date, _is_digits, _twelve_hour,
+)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def columnar_available() -> bool:
+    return np is not None
+
+
+@lru_cache(maxsize=512)
+def _day_seconds(date_part: str) -> int:
+    month, day, year = date_part.split("/")
+    if not (_is_digits(month, 1, 2) and _is_digits(day, 1, 2) and _is_digits(year, 4, 4)):
+        raise ValueError(f"not an M/D/YYYY date: {date_part!r}")
+    return datetime(int(year), int(month), int(day)).toordinal() * SECONDS_PER_DAY
+
+
+def _submission_seconds(value: str) -> int:
+    """Seconds since 0001-01-01 for a Submission Date cell."""
+    try:
+        date_part, time_part = value.split(", ")
+        clock, meridiem = time_part.split(" ")
+        hour, minute, second = clock.split(":")
+        if not (_is_digits(hour, 1, 2) and _is_digits(minute, 2, 2) and _is_digits(second, 2, 2)):
+            raise ValueError(value)
+        minute, second = int(minute), int(second)
+        if not (0 <= minute < 60 and 0 <= second < 60):
+            raise ValueError(value)
+        return _day_seconds(date_part) + _twelve_hour(int(hour), meridiem) * 3600 + minute * 60 + second
+    except ValueError:
+        dt = parse_submission_date(value)
+        return dt.toordinal() * SECONDS_PER_DAY + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def _seconds_to_datetime(seconds: int) -> datetime:
+    days, rest = divmod(int(seconds), SECONDS_PER_DAY)
+    return datetime.fromordinal(days) + timedelta(seconds=rest)
+
+
+def parse_gradesheet_columns(source, student_ids: dict, max_rows: int | None = None):
+    """Parse a gradesheet into (ids, grades, seconds, max_grade) arrays.
+
+    student_ids interns names to dense integer ids and is shared across the
+    sheets of a week. Like parse_gradesheet, a student's last row wins.
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    reader = csv.reader(source)
+    header = next(reader, [])
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        raise GradesheetError(f"missing column(s): {', '.join(missing)}")
+    name_col = header.index("Student")
+    grade_col = header.index("Grade")
+    date_col = header.index("Submission Date")
+
+    ids, grades, seconds = [], [], []
+    intern = student_ids.setdefault
+    for row in reader:
+        if not row:
+            continue
+        if max_rows is not None and len(ids) >= max_rows:
+            raise GradesheetError(f"more than {max_rows} rows")
+        ids.append(intern(row[name_col], len(student_ids)))
+        grades.append(int(row[grade_col]))
+        seconds.append(_submission_seconds(row[date_col]))
+
+    ids = np.asarray(ids, dtype=np.int64)
+    grades = np.asarray(grades, dtype=np.int64)
+    seconds = np.asarray(seconds, dtype=np.int64)
+    max_grade = int(grades.max()) if len(grades) else 0
+
+    # Keep each student's last row only
+    _, first_from_end = np.unique(ids[::-1], return_index=True)
+    last = len(ids) - 1 - first_from_end
+    return ids[last], grades[last], seconds[last], max_grade
+
+
+def compute_week_rewards_columnar(sheets: list, week: int, custom_groups: list[dict] | None = None, class_start_time: str = "02:30:00 PM", max_rows: int | None = None) -> dict:
+    """Columnar equivalent of rewards.compute_week_rewards."""
+    if np is None:
+        raise RuntimeError("The columnar engine requires numpy (pip install numpy)")
+    if not sheets:
+        raise GradesheetError("at least one gradesheet is required")
+    problem_count = len(sheets)
+
+    student_ids = {}
+    parsed = [parse_gradesheet_columns(sheet, student_ids, max_rows) for sheet in sheets]
+    full_mark = max(p[3] for p in parsed)
+    student_count = len(student_ids)
+
+    # (problem, student) matrices; missing rows have grade 0
+    present = np.zeros((problem_count, student_count), dtype=bool)
+    grades = np.zeros((problem_count, student_count), dtype=np.int64)
+    seconds = np.zeros((problem_count, student_count), dtype=np.int64)
+    for p, (ids, sheet_grades, sheet_seconds, _) in enumerate(parsed):
+        present[p, ids] = True
+        grades[p, ids] = sheet_grades
+        seconds[p, ids] = sheet_seconds
+
+    all_full = (grades == full_mark).all(axis=0)
+    full = present & (grades == full_mark)
+    eligible = full.any(axis=0)
+    masked = np.where(full, seconds, np.iinfo(np.int64).max)
+    earliest_problem = masked.argmin(axis=0)  # first problem wins ties
+    earliest_seconds = masked[earliest_problem, np.arange(student_count)]
+
+    names = list(student_ids)
+    order = sorted(range(student_count), key=names.__getitem__)
+    name_rank = np.empty(student_count, dtype=np.int64)
+    name_rank[order] = np.arange(student_count)
+
+    # Top 5 by (earliest full-mark time, name)
+    candidates = np.flatnonzero(eligible)
+    top = candidates[np.lexsort((name_rank[candidates], earliest_seconds[candidates]))][:5]
+
+    week_range, reward_points = get_reward_for_week(week, custom_groups)
+    start_hour, start_minute, start_second = parse_clock_time(class_start_time)
+    top5 = []
+    for i, sid in enumerate(top.tolist(), 1):
+        date = _seconds_to_datetime(earliest_seconds[sid])
+        start_dt = date.replace(hour=start_hour, minute=start_minute, second=start_second)
+        minutes_taken = max(0, (date - start_dt).total_seconds() / 60)
+        top5.append({
+            "rank": i,
+            "name": names[sid],
+            "submission_time": date.strftime(SUBMISSION_DATE_FORMAT),
+            "problems": f"Problem {int(earliest_problem[sid]) + 1}",
+            "time_taken": round(minutes_taken, 1),
+        })
+
+    # Materialize the per-student output in name order
+    grades_by_student = grades.T[order].tolist()
+    present_by_student = present.T[order].tolist()
+    all_full_sorted = all_full[order].tolist()
+    all_passed = []
+    not_passed = []
+    students_data = []
+    for sid, student_grades, student_present, passed in zip(order, grades_by_student, present_by_student, all_full_sorted):
+        name = names[sid]
+        if passed:
+            all_passed.append(name)
+        else:
+            entry = {"name": name}
+            for i, (g, has_row) in enumerate(zip(student_grades, student_present), 1):
+                entry[f"problem{i}"] = f"{g}/{full_mark}" if has_row else "N/A"
+            not_passed.append(entry)
+        students_data.append({
+            "student_name": name,
+            "grades": student_grades,
+            "problem1_grade": student_grades[0],
+            "problem2_grade": student_grades[1] if problem_count > 1 else 0,
+            "full_mark": full_mark,
+            "both_perfect": passed,
+        })
+
+    return {
+        "dungeon_week": week,
+        "week_range": week_range,
+        "reward_points": reward_points,
+        "full_mark": full_mark,
+        "problem_count": problem_count,
+        "both_completion": {
+            "passed": all_passed,
+            "not_passed": not_passed,
+            "total_passed": len(all_passed),
+            "total_not_passed": len(not_passed),
+        },
+        "early_submission": {
+            "top5": top5,
+            "total_eligible": int(eligible.sum()),
+        },
+        "students_data": students_data,
+    }
@@ -0,0 +1,63 @@
+"""Streak rules evaluated on week bitmasks.
+
+A student's term is an integer with bit (week - 1) set for every week that
+counts (see student_roster.perfect_mask in db.py). Every rule looks only at
+weeks 1..up_to_week and costs a few integer operations, so a rule can be
+evaluated for the whole roster at once.
+"""
+
+
+def week_mask(weeks):
+    """Bitmask of an iterable of week numbers."""
+    mask = 0
+    for week in weeks:
+        mask |= 1 << (week - 1)
+    return mask
+
+
+def week_flags(mask, up_to_week):
+    """{week: bool} for weeks 1..up_to_week, the shape of get_streak_history's weeks."""
+    return {w: bool(mask >> (w - 1) & 1) for w in range(1, up_to_week + 1)}
+
+
+def _upto(mask, up_to_week):
+    return mask & ((1 << up_to_week) - 1)
+
+
+def run_from_start(mask, up_to_week):
+    """Consecutive set weeks starting at week 1 (the reward streak)."""
+    mask = _upto(mask, up_to_week)
+    # Trailing ones of mask = trailing zeros of ~mask
+    return (~mask & (mask + 1)).bit_length() - 1
+
+
+def trailing_run(mask, up_to_week):
+    """Consecutive set weeks ending at up_to_week (the current run)."""
+    gaps = _upto(~_upto(mask, up_to_week), up_to_week)
+    return up_to_week - gaps.bit_length()
+
+
+def longest_run(mask, up_to_week):
+    """Longest run of consecutive set weeks anywhere in 1..up_to_week."""
+    mask = _upto(mask, up_to_week)
+    length = 0
+    while mask:
+        mask &= mask >> 1
+        length += 1
+    return length
+
+
+def count_in_window(mask, up_to_week, window):
+    """Set weeks among the last `window` weeks up to up_to_week."""
+    start = max(up_to_week - window, 0)
+    return (_upto(mask, up_to_week) >> start).bit_count()
+
+
+def streak_stats(mask, up_to_week, window):
+    """All of the above for one student."""
+    return {
+        "streak_length": run_from_start(mask, up_to_week),
+        "longest_run": longest_run(mask, up_to_week),
+        "current_run": trailing_run(mask, up_to_week),
+        "perfect_in_window": count_in_window(mask, up_to_week, window),
+    }
@@ -0,0 +1,204 @@
+"""Response encoding: the opt-in compact format and compression.
+
+The compact format (?format=compact or Accept: COMPACT_MEDIA_TYPE) carries
+the same data as the default JSON with less repetition:
+
+    names       every student name once; everywhere else a name is its index
+    passed      a list of name indexes
+    other lists of per-student objects (not_passed, top5, history, rewarded)
+                become {"fields": [...], "rows": [[...], ...]}
+    weeks       a bitstring, character i is week i + 1 ("1" = both perfect)
+    problemN    in not_passed, the grade as a number out of full_mark
+                (null when nothing was submitted)
+
+and is encoded with orjson when it is installed. Any response body can be
+compressed with brotli (when installed) or gzip, as the client accepts.
+"""
+
+import gzip
+import json
+import os
+import zlib
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPACT_MEDIA_TYPE = "application/vnd.rewardkeeper.compact+json"
+
+# Request headers every negotiated response depends on
+VARY = "Accept, Accept-Encoding"
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+
+def dumps(content):
+    """Serialize to compact JSON bytes, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_body(content):
+    """The default JSON body, byte for byte what JSONResponse renders."""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def size_hint(content, depth=3):
+    """Rough size of a response: the lengths of the lists in its first levels."""
+    if isinstance(content, list):
+        return len(content)
+    if isinstance(content, dict) and depth:
+        return sum(size_hint(value, depth - 1) for value in content.values())
+    return 0
+
+
+def encode(content, compact_format, encoding):
+    """(body, headers) of content in the given format and content coding.
+
+    A plain function of picklable arguments, so it can run on the CPU pool
+    in either executor mode.
+    """
+    if compact_format:
+        body, media_type = dumps(compact(content)), COMPACT_MEDIA_TYPE
+    else:
+        body, media_type = json_body(content), "application/json"
+    body, applied = compress(body, encoding)
+    headers = {"Content-Type": media_type, "Vary": VARY}
+    if applied:
+        headers["Content-Encoding"] = applied
+    return body, headers
+
+
+def wants_compact(request):
+    if request.query_params.get("format") == "compact":
+        return True
+    return COMPACT_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def choose_encoding(accept_encoding, streaming=False):
+    """The content coding to use for a request's Accept-Encoding, or None.
+
+    brotli is preferred when installed; streamed bodies only use gzip.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    candidates = ("gzip",) if streaming or brotli is None else ("br", "gzip")
+    for coding in candidates:
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body, encoding):
+    """(body, encoding actually applied); small bodies are left as they are."""
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+
+
+def gzip_stream_compressor():
+    """zlib compressobj producing a gzip stream, for chunked responses."""
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+# --- Compact format ---
+
+class _Names:
+    def __init__(self):
+        self.index = {}
+
+    def __call__(self, name):
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.index)
+        return i
+
+    def table(self):
+        return list(self.index)
+
+
+def _week_bits(weeks):
+    return "".join("1" if weeks[w] else "0" for w in sorted(weeks, key=int))
+
+
+def _grade(value):
+    """'4.5/5' -> 4.5, '3/5' -> 3, 'N/A' (no submission) -> None."""
+    if value == "N/A":
+        return None
+    grade = float(str(value).split("/", 1)[0])
+    return int(grade) if grade.is_integer() else grade
+
+
+def _table(entries, names, convert=None):
+    fields = []
+    for entry in entries:
+        for key in entry:
+            if key not in fields:
+                fields.append(key)
+    rows = []
+    for entry in entries:
+        row = []
+        for key in fields:
+            value = entry.get(key)
+            if key == "name":
+                value = names(value)
+            elif key == "weeks":
+                value = _week_bits(value)
+            elif convert and key in convert and value is not None:
+                value = convert[key](value)
+            row.append(value)
+        rows.append(row)
+    return {"fields": fields, "rows": rows}
+
+
+def compact(content):
+    """The compact form of a /api/compute, /api/streak or /api/week-data response."""
+    names = _Names()
+    out = {"format": "compact", **content}
+
+    completion = content.get("both_completion")
+    if completion is not None:
+        not_passed = completion["not_passed"]
+        problems = {key for entry in not_passed for key in entry if key.startswith("problem")}
+        out["both_completion"] = {
+            **completion,
+            "passed": [names(n) for n in completion["passed"]],
+            "not_passed": _table(not_passed, names, dict.fromkeys(problems, _grade)),
+        }
+
+    early = content.get("early_submission")
+    if early is not None:
+        out["early_submission"] = {**early, "top5": _table(early["top5"], names)}
+
+    streak = content.get("streak")
+    if streak is not None:
+        out["streak"] = dict(streak)
+        for key in ("history", "rewarded"):
+            if key in streak:
+                out["streak"][key] = _table(streak[key], names)
+
+    out["names"] = names.table()
+    return out
@@ -400,6 +400,9 @@ export default function App() {
             >
               Download CSV
             </button>
+            <a className="download-btn csv-btn" href={`${API}/export/${taName}?format=xlsx`}>
+              Term Report (XLSX)
+            </a>
             <SendRewardsButton
               taName={taName}
               week={displayData.dungeon_week}
@@ -2,6 +2,35 @@ import { useState, useEffect } from "react";
 
 const API = import.meta.env.VITE_API_URL || "/api";
 
+// The PV roster is cached per TA so repeat syncs only download changes
+function loadRoster(taName) {
+  try {
+    return JSON.parse(localStorage.getItem(`pvRoster:${taName}`));
+  } catch {
+    return null;
+  }
+}
+
+function applyRoster(taName, cached, data) {
+  let students = data.pv_students;
+  if (data.pv_students_delta && cached) {
+    const { changed, removed } = data.pv_students_delta;
+    const replaced = new Set([...removed, ...changed.map((s) => s.studentId)]);
+    students = cached.students
+      .filter((s) => !replaced.has(s.studentId))
+      .concat(changed)
+      .sort((a, b) => (a.name || "").localeCompare(b.name || ""));
+  }
+  students = students || [];
+  if (data.roster_version != null) {
+    localStorage.setItem(
+      `pvRoster:${taName}`,
+      JSON.stringify({ classroomId: data.classroom_id, version: data.roster_version, students })
+    );
+  }
+  return students;
+}
+
 export default function StudentMapping({ taName, onClose }) {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -20,17 +49,22 @@ export default function StudentMapping({ taName, onClose }) {
     setLoading(true);
     setError(null);
     try {
+      const cached = loadRoster(taName);
       const res = await fetch(`${API}/prizeversity/sync-students`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ ta_name: taName }),
+        body: JSON.stringify({
+          ta_name: taName,
+          classroom_id: cached?.classroomId ?? null,
+          roster_version: cached?.version ?? null,
+        }),
       });
       if (!res.ok) {
         const body = await res.json().catch(() => null);
         throw new Error(body?.detail || "Failed to sync students");
       }
       const data = await res.json();
-      setPvStudents(data.pv_students || []);
+      setPvStudents(applyRoster(taName, cached, data));
 
       // Merge saved mappings with auto-matched
       const savedLookup = {};